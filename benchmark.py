@@ -0,0 +1,759 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for pyggg.
+
+Histories are generated deterministically from a shape, a commit count and
+a seed. They are either turned into a real repository with git fast-import
+(--source git, measures git + parsing too) or fed straight into the
+renderer as a synthetic commit stream (--source stream, layout and
+formatting only).
+
+    python3 benchmark.py run [--shapes linear,branches] [--commits 10000]
+                             [--source git|stream] [--json results.json]
+    python3 benchmark.py compare old.json new.json
+    python3 benchmark.py allocations [--shape branches] [--commits 5000]
+    python3 benchmark.py parse [--shape branches] [--commits 100000]
+    python3 benchmark.py memory [--shape branches] [--commits 100000]
+    python3 benchmark.py startup [--runs 20] [--budget-ms 60]
+    python3 benchmark.py records
+    python3 benchmark.py engines [--shapes linear,branches] [--commits 3000]
+
+Every stage reports commits/sec, the time until its first item and the
+peak RSS reached while it ran. Results saved with --json can be compared
+across pyggg versions with 'compare'. 'records' checks that --format
+binary decodes to the same records as --format json, and 'engines' that
+both layout engines compute the same symbols.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import struct
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+from pyggg import Commit, CommitStore, GraphSymbol, TigGraphV2, TigGraphV2NumPy, TigStyleRendererV2, create_graph
+
+SHAPES = ('linear', 'branches', 'parallel', 'octopus', 'crisscross', 'fanout')
+AUTHORS = ('Alice Example', 'bob', 'Carol de la Very Long Surname', 'dave', 'Erin')
+
+
+def synthetic_history(shape: str, commits: int, seed: int = 0) -> List[List[int]]:
+    """Build a deterministic DAG, returned in topological (newest first) order.
+
+    Entry i holds the parent IDs of commit i; IDs are output positions, so
+    every parent has a larger ID than its children.
+
+    Shapes:
+      linear      a single chain
+      branches    short-lived feature branches forking from and merging
+                  back into a mainline
+      parallel    32 long-lived branches advancing side by side, merging
+                  into and from the mainline now and then
+      octopus     8 branches regularly merged into the mainline together
+      crisscross  4 branches repeatedly merging each other
+      fanout      bursts of 100 branches forking from the same commit
+    """
+    rnd = random.Random(seed)
+    parents = [[]]  # Oldest first, indexes into this list
+
+    def add(*commit_parents):
+        parents.append(list(commit_parents))
+        return len(parents) - 1
+
+    if shape == 'linear':
+        while len(parents) < commits:
+            add(len(parents) - 1)
+
+    elif shape == 'branches':
+        tips = [0]
+        while len(parents) < commits:
+            lane = rnd.randrange(len(tips))
+            r = rnd.random()
+            if r < 0.05 and len(tips) < 64:
+                tips.append(tips[0])
+                lane = len(tips) - 1
+            if r > 0.95 and lane and tips[lane] != tips[0]:
+                tips[0] = add(tips[0], tips.pop(lane))
+                continue
+            tips[lane] = add(tips[lane])
+
+    elif shape == 'parallel':
+        tips = [0] * 32
+        while len(parents) < commits:
+            lane = rnd.randrange(len(tips))
+            r = rnd.random()
+            if r < 0.02 and lane and tips[lane] != tips[0]:
+                tips[0] = add(tips[0], tips[lane])
+            elif r < 0.03 and lane and tips[lane] != tips[0]:
+                tips[lane] = add(tips[lane], tips[0])
+            else:
+                tips[lane] = add(tips[lane])
+
+    elif shape == 'octopus':
+        tips = [0] * 8
+        while len(parents) < commits:
+            if rnd.random() < 0.02:
+                merged = sorted({tip for tip in tips[1:] if tip != tips[0]})
+                if merged:
+                    tips[0] = add(tips[0], *rnd.sample(merged, min(len(merged), rnd.randint(2, 7))))
+                    continue
+            lane = rnd.randrange(len(tips))
+            tips[lane] = add(tips[lane])
+
+    elif shape == 'crisscross':
+        tips = [0] * 4
+        while len(parents) < commits:
+            a, b = rnd.sample(range(len(tips)), 2)
+            if rnd.random() < 0.1 and tips[a] != tips[b]:
+                old_a, old_b = tips[a], tips[b]
+                tips[a] = add(old_a, old_b)
+                tips[b] = add(old_b, old_a)
+            else:
+                tips[a] = add(tips[a])
+
+    elif shape == 'fanout':
+        main = 0
+        while len(parents) < commits:
+            base = main
+            branches = [add(base) for _ in range(min(100, commits - len(parents)))]
+            for i, tip in enumerate(branches):
+                for _ in range(rnd.randint(0, 2)):
+                    tip = add(tip)
+                branches[i] = tip
+            for tip in branches:
+                if len(parents) >= commits:
+                    break
+                main = add(main, tip) if main != tip else main
+            main = add(main)
+
+    else:
+        raise ValueError(f'unknown shape: {shape}')
+
+    del parents[commits:]
+    last = len(parents) - 1
+    return [[last - parent for parent in parents[last - i]] for i in range(len(parents))]
+
+
+def synthetic_hash(commit_id: int) -> str:
+    return f'{commit_id + 1:040x}'
+
+
+def synthetic_commits(history: List[List[int]]) -> List[Commit]:
+    """Commit objects for a synthetic history, as get_commits() would return them"""
+    commits = []
+    for commit_id, parent_ids in enumerate(history):
+        commit_hash = synthetic_hash(commit_id)
+        commits.append(Commit(
+            hash=commit_hash,
+            short_hash=commit_hash[:7],
+            parents=[synthetic_hash(parent) for parent in parent_ids],
+            author=AUTHORS[commit_id % len(AUTHORS)],
+            date='2025-01-01 00:00',
+            timezone='Z',
+            message=f'Commit {commit_id}',
+            refs=[],
+            id=commit_id,
+            parent_ids=parent_ids,
+        ))
+    return commits
+
+
+def build_repo(path: str, history: List[List[int]]):
+    """Create a git repository holding the history, using git fast-import.
+
+    Every commit has the empty tree. Commits without children get a branch
+    and every 1000th commit a tag, so the refs look somewhat realistic.
+    """
+    subprocess.run(['git', 'init', '-q', path], check=True)
+    proc = subprocess.Popen(['git', '-C', path, 'fast-import', '--quiet'], stdin=subprocess.PIPE)
+    has_children = set()
+    date = 1500000000
+    out = []
+
+    # Oldest first, so parents exist before their children
+    for commit_id in range(len(history) - 1, -1, -1):
+        parent_ids = history[commit_id]
+        has_children.update(parent_ids)
+        author = AUTHORS[commit_id % len(AUTHORS)]
+        message = f'Commit {len(history) - commit_id}'.encode()
+        mark = len(history) - commit_id
+        if not parent_ids:
+            out.append('reset refs/heads/bench\n')
+        out.append(f'commit refs/heads/bench\nmark :{mark}\n'
+                   f'committer {author} <{author.split()[0].lower()}@example.com> {date + mark * 60} +0000\n'
+                   f'data {len(message)}\n{message.decode()}\n')
+        for i, parent_id in enumerate(parent_ids):
+            out.append(f"{'from' if i == 0 else 'merge'} :{len(history) - parent_id}\n")
+        out.append('\n')
+        if len(out) > 10000:
+            proc.stdin.write(''.join(out).encode())
+            out = []
+
+    for commit_id in range(len(history)):
+        mark = len(history) - commit_id
+        if commit_id not in has_children:
+            out.append(f'reset refs/heads/tip-{commit_id}\nfrom :{mark}\n\n')
+        if mark % 1000 == 0:
+            out.append(f'reset refs/tags/v{mark}\nfrom :{mark}\n\n')
+    proc.stdin.write(''.join(out).encode())
+    proc.stdin.close()
+    if proc.wait() != 0:
+        raise RuntimeError(f'git fast-import failed for {path}')
+    subprocess.run(['git', '-C', path, 'update-ref', '-d', 'refs/heads/bench'], check=True)
+    subprocess.run(['git', '-C', path, 'symbolic-ref', 'HEAD', 'refs/heads/tip-0'], check=True)
+
+
+def reset_peak_rss():
+    """Reset the peak RSS counter where the OS allows it (Linux)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS since the last reset_peak_rss(), or of the whole process"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Stage:
+    """Timing and memory of one pipeline stage"""
+
+    def __init__(self):
+        reset_peak_rss()
+        self.start = time.perf_counter()
+        self.busy = 0.0
+        self.first = None
+        self.count = 0
+
+    def item(self, busy: float = None):
+        """Record one processed commit; busy is its cost when the stage is interleaved"""
+        self.count += 1
+        if self.first is None:
+            self.first = time.perf_counter() - self.start
+        if busy is not None:
+            self.busy += busy
+
+    def result(self) -> dict:
+        seconds = self.busy or (time.perf_counter() - self.start)
+        return {
+            'commits': self.count,
+            'seconds': round(seconds, 4),
+            'commits_per_sec': round(self.count / seconds) if seconds else None,
+            'first_seconds': None if self.first is None else round(self.first, 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+
+
+def bench_pipeline(history: List[List[int]], repo_path: str = None, engine: str = 'auto') -> dict:
+    """Measure parse, layout and format separately, then the whole pipeline.
+
+    Without repo_path the commits come from synthetic_commits() and only
+    layout and format are measured.
+    """
+    stages = {}
+    renderer = TigStyleRendererV2(repo_path or '.', engine)
+
+    if repo_path:
+        stage = Stage()
+        commits = []
+        for commit in renderer.iter_commits():
+            commits.append(commit)
+            stage.item()
+        stages['parse'] = stage.result()
+    else:
+        commits = synthetic_commits(history)
+
+    stage = Stage()
+    for commit in commits:
+        renderer.layout_commit(commit)
+        stage.item()
+    stages['layout'] = stage.result()
+
+    # Formatting needs the rows, which are not kept: lay out again and only
+    # count the time spent formatting
+    renderer.graph = create_graph(engine)
+    stage = Stage()
+    for commit in commits:
+        canvas_symbols = renderer.layout_commit(commit)
+        start = time.perf_counter()
+        renderer.format_commit(commit, canvas_symbols, 20)
+        stage.item(time.perf_counter() - start)
+    stages['format'] = stage.result()
+    del commits
+
+    if repo_path:
+        stage = Stage()
+        for _ in TigStyleRendererV2(repo_path, engine).iter_lines(author_width=20):
+            stage.item()
+        stages['end_to_end'] = stage.result()
+
+    return stages
+
+
+def bench_allocations(history: List[List[int]]) -> dict:
+    """Memory churn and time of the per-commit layout steps.
+
+    tracemalloc's peak is reset before every commit, so peak - current
+    after it is the short-lived memory that commit needed. The step
+    timings are taken in a separate untraced run.
+    """
+    graph = TigGraphV2()
+    transient = 0
+    tracemalloc.start()
+
+    for commit_id, parent_ids in enumerate(history):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        graph.add_commit(commit_id, parent_ids)
+        graph.render_parents([])
+        current, peak = tracemalloc.get_traced_memory()
+        transient += peak - min(before, current)
+
+    tracemalloc.stop()
+
+    graph = TigGraphV2()
+    steps = ('generate_next_row', 'generate_symbols', 'commit_next_row')
+    seconds = dict.fromkeys(steps, 0.0)
+
+    def timed(step):
+        method = getattr(graph, step)
+
+        def wrapper(*args):
+            start = time.perf_counter()
+            method(*args)
+            seconds[step] += time.perf_counter() - start
+        return wrapper
+
+    for step in steps:
+        setattr(graph, step, timed(step))
+
+    start = time.perf_counter()
+    for commit_id, parent_ids in enumerate(history):
+        graph.add_commit(commit_id, parent_ids)
+        graph.render_parents([])
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'commits': len(history),
+        'transient_bytes_per_commit': transient / len(history),
+        'layout_seconds': elapsed,
+    }
+    for step in steps:
+        result[f'{step}_us_per_commit'] = seconds[step] / len(history) * 1e6
+    return result
+
+
+def bench_parse(repo_path: str) -> dict:
+    """CPU time and memory of parsing git log output, without layout.
+
+    Only this process's CPU time is counted, so the time git itself spends
+    walking the history is left out. Commits are dropped as soon as they
+    are parsed; the traced peak is the memory the parser itself holds.
+    """
+    def parse():
+        # Release IDs as layout would, or the ID table holds every commit
+        renderer = TigStyleRendererV2(repo_path)
+        count = 0
+        for commit in renderer.iter_commits():
+            renderer.release_id(commit.hash)
+            count += 1
+        return count
+
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    commits = parse()
+    cpu = time.process_time() - start_cpu
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'commits': commits,
+        'cpu_seconds': cpu,
+        'wall_seconds': elapsed,
+        'cpu_us_per_commit': cpu / commits * 1e6 if commits else 0.0,
+        'peak_traced_kb': peak / 1024,
+    }
+
+
+def bench_memory(history: List[List[int]]) -> dict:
+    """Bytes per commit held by a list of Commits and by a CommitStore.
+
+    The commits are parsed from synthetic log records one at a time, like
+    iter_commits() does, so every hash, date and subject is its own string
+    and only what the container keeps stays traced.
+    """
+    def traced(container, add):
+        renderer = TigStyleRendererV2('.')
+        tracemalloc.start()
+        for commit_id, parent_ids in enumerate(history):
+            commit = renderer._parse_commit([
+                synthetic_hash(commit_id), ' '.join(synthetic_hash(parent) for parent in parent_ids),
+                AUTHORS[commit_id % len(AUTHORS)], f'{1700000000 + 600 * commit_id} +0100',
+                f'Commit {commit_id}', '>'])
+            renderer.release_id(commit.hash)
+            add(container, commit)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return size
+
+    listed = traced([], list.append)
+    stored = traced(CommitStore(), CommitStore.append)
+    return {
+        'commits': len(history),
+        'list_bytes_per_commit': listed / len(history),
+        'store_bytes_per_commit': stored / len(history),
+        'ratio': listed / stored,
+    }
+
+
+STARTUP_BUDGET_MS = 60  # Wall clock of the installed ggg on a 10-commit repository
+
+
+def import_times(lib_dir: str) -> dict:
+    """Cumulative import time in ms of each module 'import pyggg' loads, from -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import pyggg'],
+                            cwd=lib_dir, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1000
+    return times
+
+
+def timed_run(command: List[str], cwd: str) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def bench_startup(repo_path: str, runs: int) -> dict:
+    """Fixed cost of one ggg run: imports and wall clock on a tiny repository.
+
+    'script' runs pyggg.py directly, which compiles it every time.
+    'installed' imports it from compiled bytecode like the ggg launcher
+    written by install.sh. 'python' is the interpreter starting alone.
+    Everything runs in a directory holding only the compiled copy, so the
+    pyggg.py next to this script is never imported instead.
+    """
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyggg.py')
+    with tempfile.TemporaryDirectory() as lib_dir:
+        shutil.copy(source, lib_dir)
+        subprocess.run([sys.executable, '-m', 'compileall', '-q', lib_dir], check=True)
+        commands = {
+            'python': [sys.executable, '-c', 'pass'],
+            'script': [sys.executable, source, repo_path],
+            'installed': [sys.executable, '-c', 'from pyggg import run; run()', repo_path],
+        }
+
+        result = {'runs': runs}
+        for name, command in commands.items():
+            seconds = sorted(timed_run(command, lib_dir) for _ in range(runs))
+            result[f'{name}_min_ms'] = seconds[0] * 1000
+            result[f'{name}_median_ms'] = seconds[len(seconds) // 2] * 1000
+        times = import_times(lib_dir)
+
+    result['import_pyggg_ms'] = times.get('pyggg', 0.0)
+    for module in ('subprocess', 'json', 'dataclasses', 'typing', 'multiprocessing', 'socket'):
+        if module in times:
+            result[f'import_{module}_ms'] = times[module]
+    return result
+
+
+def check_engines(history: List[List[int]], max_columns: int = 0) -> dict:
+    """Lay a history out with TigGraphV2 and with TigGraphV2NumPy vectorizing every row.
+
+    Counts the commits whose symbols or lane differ between the two.
+    """
+    graphs = (TigGraphV2(), TigGraphV2NumPy(min_width=0))
+    mismatches = 0
+    first_mismatch = None
+    width = 0
+    for commit_id, parent_ids in enumerate(history):
+        rows = []
+        for graph in graphs:
+            graph.max_columns = max_columns
+            symbols = []
+            graph.add_commit(commit_id, parent_ids)
+            graph.render_parents(symbols)
+            rows.append((symbols, graph.prev_position))
+        width = max(width, len(rows[0][0]))
+        if rows[0] != rows[1]:
+            mismatches += 1
+            if first_mismatch is None:
+                first_mismatch = commit_id
+    return {
+        'commits': len(history),
+        'max_width': width,
+        'mismatches': mismatches,
+        'first_mismatch': -1 if first_mismatch is None else first_mismatch,
+    }
+
+
+MANY_REFS = 300  # Refs of one commit in the 'records' repository, more than a byte can count
+
+
+def read_records(data: bytes) -> List[dict]:
+    """Decode a --format binary stream into records shaped like --format json's, without the glyphs"""
+    renderer = TigStyleRendererV2
+    if not data.startswith(renderer.BINARY_HEADER):
+        raise ValueError('not a pyggg binary stream of this version')
+    records = []
+    offset = len(renderer.BINARY_HEADER)
+    while offset < len(data):
+        size, flags, hash_len, parent_count, ref_count, lane, columns = renderer.RECORD_HEADER.unpack_from(data, offset)
+        position = offset + renderer.RECORD_HEADER.size
+        symbols = struct.unpack_from(f'<{columns}I', data, position)
+        position += 4 * columns
+        hashes = [data[position + i * hash_len:position + (i + 1) * hash_len].hex() for i in range(1 + parent_count)]
+        position += len(hashes) * hash_len
+        strings = []
+        for _ in range(4 + ref_count):
+            length = struct.unpack_from('<I', data, position)[0]
+            strings.append(data[position + 4:position + 4 + length].decode('utf-8', 'surrogateescape'))
+            position += 4 + length
+        records.append({
+            'hash': hashes[0],
+            'parents': hashes[1:],
+            'date': strings[0],
+            'timezone': strings[1],
+            'author': strings[2],
+            'refs': strings[4:],
+            'message': strings[3],
+            'boundary': bool(flags & renderer.RECORD_BOUNDARY),
+            'lane': lane,
+            'folded': bool(flags & renderer.RECORD_FOLDED),
+            'colors': [GraphSymbol.color(symbol) for symbol in symbols],
+            'flags': [symbol & GraphSymbol.FLAGS_MASK for symbol in symbols],
+        })
+        offset += 4 + size
+    return records
+
+
+def check_records(history: List[List[int]]) -> dict:
+    """Compare the binary and JSON records of a repository, one commit of which has MANY_REFS tags"""
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyggg.py')
+    with tempfile.TemporaryDirectory() as repo_path:
+        build_repo(repo_path, history)
+        tip = subprocess.run(['git', '-C', repo_path, 'rev-parse', 'HEAD'],
+                             capture_output=True, text=True, check=True).stdout.strip()
+        tags = ''.join(f'create refs/tags/many-{i:03} {tip}\n' for i in range(MANY_REFS))
+        subprocess.run(['git', '-C', repo_path, 'update-ref', '--stdin'], input=tags, text=True, check=True)
+
+        def output(output_format: str) -> bytes:
+            return subprocess.run([sys.executable, source, '--format', output_format, repo_path],
+                                  capture_output=True, check=True).stdout
+
+        binary = read_records(output('binary'))
+        expected = [json.loads(line) for line in output('json').decode('utf-8', 'surrogateescape').splitlines()]
+
+    mismatches = 0
+    for record, json_record in zip(binary, expected):
+        del json_record['graph'], json_record['glyphs']
+        mismatches += record != json_record
+    return {
+        'commits': len(expected),
+        'binary_records': len(binary),
+        'most_refs': max(len(record['refs']) for record in binary),
+        'mismatches': mismatches + abs(len(binary) - len(expected)),
+    }
+
+
+def repository(repo_dir: str, shape: str, commits: int, seed: int, history: List[List[int]]) -> str:
+    """Path of the generated repository for a history, building it if needed"""
+    repo_path = os.path.join(repo_dir, f'{shape}-{commits}-{seed}')
+    if not os.path.isdir(repo_path):
+        print(f'Building {repo_path}...', file=sys.stderr)
+        build_repo(repo_path, history)
+    return repo_path
+
+
+def pyggg_version() -> str:
+    """Commit of the pyggg checkout being measured, when it is a git checkout"""
+    try:
+        return subprocess.run(['git', '-C', os.path.dirname(os.path.abspath(__file__)), 'describe',
+                               '--always', '--dirty'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(args) -> dict:
+    results = []
+    for shape in args.shapes.split(','):
+        history = synthetic_history(shape, args.commits, args.seed)
+        repo_path = None
+        if args.source == 'git':
+            repo_path = repository(args.repo_dir, shape, args.commits, args.seed, history)
+
+        stages = bench_pipeline(history, repo_path, args.engine)
+        results.append({'shape': shape, 'commits': args.commits, 'seed': args.seed,
+                        'source': args.source, 'stages': stages})
+
+        for name, stage in stages.items():
+            print(f"{shape:11} {name:11} {stage['commits_per_sec'] or 0:>9} commits/s  "
+                  f"first {stage['first_seconds'] or 0:7.3f}s  "
+                  f"total {stage['seconds']:8.3f}s  peak {stage['peak_rss_mb']:7.1f} MB")
+
+    return {
+        'pyggg': pyggg_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'engine': args.engine,
+        'results': results,
+    }
+
+
+def compare(old_path: str, new_path: str):
+    """Print commits/sec and peak RSS ratios between two result files"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    print(f"{old['pyggg']} -> {new['pyggg']}")
+    old_results = {(r['shape'], r['commits'], r['source']): r for r in old['results']}
+    for result in new['results']:
+        before = old_results.get((result['shape'], result['commits'], result['source']))
+        if not before:
+            continue
+        for name, stage in result['stages'].items():
+            old_stage = before['stages'].get(name)
+            if not old_stage or not old_stage['commits_per_sec'] or not stage['commits_per_sec']:
+                continue
+            speed = stage['commits_per_sec'] / old_stage['commits_per_sec']
+            memory = stage['peak_rss_mb'] / old_stage['peak_rss_mb']
+            print(f"{result['shape']:11} {name:11} speed x{speed:5.2f}  peak RSS x{memory:5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='measure the pipeline stages')
+    run_parser.add_argument('--shapes', default=','.join(SHAPES))
+    run_parser.add_argument('--commits', type=int, default=10000)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--source', default='git', choices=['git', 'stream'])
+    run_parser.add_argument('--engine', default='auto', choices=['auto', 'python', 'numpy'])
+    run_parser.add_argument('--repo-dir', default=os.path.join(os.environ.get('TMPDIR', '/tmp'), 'pyggg-bench'),
+                            help='where generated repositories are kept between runs')
+    run_parser.add_argument('--json', help='save the results to this file')
+
+    compare_parser = commands.add_parser('compare', help='compare two --json result files')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+
+    alloc_parser = commands.add_parser('allocations', help='memory churn of the layout steps')
+    alloc_parser.add_argument('--shape', default='branches', choices=SHAPES)
+    alloc_parser.add_argument('--commits', type=int, default=5000)
+    alloc_parser.add_argument('--seed', type=int, default=0)
+
+    parse_parser = commands.add_parser('parse', help='CPU time and memory of parsing git log output')
+    parse_parser.add_argument('--shape', default='branches', choices=SHAPES)
+    parse_parser.add_argument('--commits', type=int, default=100000)
+    parse_parser.add_argument('--seed', type=int, default=0)
+    parse_parser.add_argument('--repo-dir', default=os.path.join(os.environ.get('TMPDIR', '/tmp'), 'pyggg-bench'),
+                              help='where generated repositories are kept between runs')
+
+    memory_parser = commands.add_parser('memory', help='bytes per commit of a commit list and a CommitStore')
+    memory_parser.add_argument('--shape', default='branches', choices=SHAPES)
+    memory_parser.add_argument('--commits', type=int, default=100000)
+    memory_parser.add_argument('--seed', type=int, default=0)
+
+    startup_parser = commands.add_parser('startup', help='import time and wall clock on a 10-commit repository')
+    startup_parser.add_argument('--runs', type=int, default=20)
+    startup_parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                                help='fail when the installed ggg takes longer (median)')
+    startup_parser.add_argument('--repo-dir', default=os.path.join(os.environ.get('TMPDIR', '/tmp'), 'pyggg-bench'),
+                                help='where generated repositories are kept between runs')
+
+    records_parser = commands.add_parser('records', help='check --format binary against --format json')
+    records_parser.add_argument('--shape', default='branches', choices=SHAPES)
+    records_parser.add_argument('--commits', type=int, default=500)
+    records_parser.add_argument('--seed', type=int, default=0)
+
+    engines_parser = commands.add_parser('engines', help='check that both layout engines compute the same symbols')
+    engines_parser.add_argument('--shapes', default=','.join(SHAPES))
+    engines_parser.add_argument('--commits', type=int, default=3000)
+    engines_parser.add_argument('--seed', type=int, default=0)
+    engines_parser.add_argument('--max-columns', type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        for shape in args.shapes.split(','):
+            if shape not in SHAPES:
+                parser.error(f'unknown shape: {shape}')
+        report = run(args)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    elif args.command == 'compare':
+        compare(args.old, args.new)
+    elif args.command == 'startup':
+        repo_path = repository(args.repo_dir, 'linear', 10, 0, synthetic_history('linear', 10))
+        result = bench_startup(repo_path, args.runs)
+        for name, value in result.items():
+            print(f'{name:34} {value:.1f}' if isinstance(value, float) else f'{name:34} {value}')
+        if result['installed_median_ms'] > args.budget_ms:
+            print(f"over budget: {result['installed_median_ms']:.1f} ms > {args.budget_ms:g} ms", file=sys.stderr)
+            return 1
+    elif args.command == 'engines':
+        failed = False
+        for shape in args.shapes.split(','):
+            if shape not in SHAPES:
+                parser.error(f'unknown shape: {shape}')
+            result = check_engines(synthetic_history(shape, args.commits, args.seed), args.max_columns)
+            print(f"{shape:11} {result['commits']:>8} commits  width {result['max_width']:>4}  "
+                  f"mismatches {result['mismatches']}")
+            if result['mismatches']:
+                print(f"{shape}: engines differ from commit {result['first_mismatch']} on", file=sys.stderr)
+                failed = True
+        if failed:
+            return 1
+    elif args.command == 'records':
+        result = check_records(synthetic_history(args.shape, args.commits, args.seed))
+        for name, value in result.items():
+            print(f'{name:34} {value}')
+        if result['mismatches'] or result['most_refs'] < MANY_REFS:
+            print('binary records differ from the JSON records', file=sys.stderr)
+            return 1
+    else:
+        history = synthetic_history(args.shape, args.commits, args.seed)
+        if args.command == 'parse':
+            result = bench_parse(repository(args.repo_dir, args.shape, args.commits, args.seed, history))
+        elif args.command == 'memory':
+            result = bench_memory(history)
+        else:
+            result = bench_allocations(history)
+        for name, value in result.items():
+            print(f'{name:34} {value:.1f}' if isinstance(value, float) else f'{name:34} {value}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
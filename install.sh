@@ -83,9 +83,25 @@ if [ -z "$INSTALL_DIR" ]; then
     echo
 fi
 
-# Install ggg (copy)
+# Install ggg: a small launcher importing pyggg from a lib directory, so
+# Python reuses its compiled bytecode instead of compiling the whole script
+# on every run. Falls back to a copy of the script if there is no lib
+# directory to write to.
+LIB_DIR="$(dirname "$INSTALL_DIR")/lib/pyggg"
 echo "Installing ggg to $INSTALL_DIR/ggg..."
-cp "$SOURCE_SCRIPT" "$INSTALL_DIR/ggg"
+if mkdir -p "$LIB_DIR" 2>/dev/null && cp "$SOURCE_SCRIPT" "$LIB_DIR/pyggg.py" 2>/dev/null; then
+    python3 -m compileall -q "$LIB_DIR" > /dev/null 2>&1 || true
+    cat > "$INSTALL_DIR/ggg" << EOF
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, '$LIB_DIR')
+from pyggg import run
+if __name__ == '__main__':
+    run()
+EOF
+else
+    cp "$SOURCE_SCRIPT" "$INSTALL_DIR/ggg"
+fi
 chmod +x "$INSTALL_DIR/ggg"
 
 # Install gg (wrapper script)
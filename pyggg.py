@@ -8,86 +8,360 @@ Generated with [Claude Code](https://claude.com/claude-code)
 Based on the original C code from Tig's graph-v2.c - https://github.com/jonas/tig
 """
 
+from __future__ import annotations
+
+import codecs
+import heapq
+import itertools
 import subprocess
 import sys
 import os
-from typing import List, Optional
-from dataclasses import dataclass, field
-from datetime import datetime, timezone
+import signal
+import struct
+import threading
+import time
+import zlib
+from array import array
+
+# Only modules that load fast (or that subprocess loads anyway) are
+# imported here: a plain run has to start quickly. The others (json,
+# hashlib, mmap, queue, socket, socketserver, multiprocessing) are
+# imported by the functions that need them.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import mmap
+    import socket
+    from typing import Iterable, Iterator, List, Optional
 
 
-@dataclass
 class GraphSymbol:
-    """Replicates struct graph_symbol from graph-v2.c"""
-    color: int = 0
+    """Replicates struct graph_symbol from graph-v2.c, packed into an int.
 
+    Every flag is one bit of the symbol; the color is stored above the flag
+    bits. Glyph lookups only depend on the flag bits, so they are memoized
+    per bitmask (see TigGraphV2.symbol_to_box).
+    """
     # Basic flags
-    commit: bool = False
-    boundary: bool = False
-    initial: bool = False
-    merge: bool = False
+    COMMIT = 1 << 0
+    BOUNDARY = 1 << 1
+    INITIAL = 1 << 2
+    MERGE = 1 << 3
 
     # Continuation flags
-    continued_down: bool = False
-    continued_up: bool = False
-    continued_right: bool = False
-    continued_left: bool = False
-    continued_up_left: bool = False
+    CONTINUED_DOWN = 1 << 4
+    CONTINUED_UP = 1 << 5
+    CONTINUED_RIGHT = 1 << 6
+    CONTINUED_LEFT = 1 << 7
+    CONTINUED_UP_LEFT = 1 << 8
 
     # Parent flags
-    parent_down: bool = False
-    parent_right: bool = False
+    PARENT_DOWN = 1 << 9
+    PARENT_RIGHT = 1 << 10
 
     # Position flags
-    below_commit: bool = False
-    flanked: bool = False
-    next_right: bool = False
-    matches_commit: bool = False
+    BELOW_COMMIT = 1 << 11
+    FLANKED = 1 << 12
+    NEXT_RIGHT = 1 << 13
+    MATCHES_COMMIT = 1 << 14
 
     # Shift flags
-    shift_left: bool = False
-    continue_shift: bool = False
-    below_shift: bool = False
+    SHIFT_LEFT = 1 << 15
+    CONTINUE_SHIFT = 1 << 16
+    BELOW_SHIFT = 1 << 17
 
     # Column flags
-    new_column: bool = False
-    empty: bool = False
+    NEW_COLUMN = 1 << 18
+    EMPTY = 1 << 19
+
+    COLOR_SHIFT = 20
+    FLAGS_MASK = (1 << COLOR_SHIFT) - 1
+
+    @staticmethod
+    def color(symbol: int) -> int:
+        """Extract the color from a packed symbol"""
+        return symbol >> GraphSymbol.COLOR_SHIFT
 
 
-@dataclass
-class GraphColumn:
-    """Replicates struct graph_column from graph-v2.c"""
-    symbol: GraphSymbol = field(default_factory=GraphSymbol)
-    id: Optional[str] = None  # Parent SHA1 ID
+# Interned id of a free column (struct graph_column with a NULL id)
+NO_COMMIT = -1
+
+# Hex digits of a short hash, unless more are needed to tell commits apart
+SHORT_HASH_LENGTH = 7
 
 
-@dataclass
 class GraphRow:
-    """Replicates struct graph_row from graph-v2.c"""
-    columns: List[GraphColumn] = field(default_factory=list)
+    """Replicates struct graph_row from graph-v2.c.
+
+    The struct graph_column entries are stored column-wise: ids[i] is the
+    interned commit id column i is waiting for (NO_COMMIT when free) and
+    symbols[i] its GraphSymbol bits.
+    """
+    __slots__ = ('ids', 'symbols')
+
+    def __init__(self, ids: Optional[array] = None, symbols: Optional[array] = None):
+        self.ids = array('i') if ids is None else ids
+        self.symbols = array('i') if symbols is None else symbols
+
+    def __eq__(self, other):
+        if not isinstance(other, GraphRow):
+            return NotImplemented
+        return self.ids == other.ids and self.symbols == other.symbols
+
+    def __repr__(self):
+        return f'GraphRow(ids={self.ids!r}, symbols={self.symbols!r})'
 
     @property
     def size(self) -> int:
-        return len(self.columns)
+        return len(self.ids)
+
+    def copy_column(self, pos: int, source: 'GraphRow', source_pos: int):
+        """Copy a column from another (or the same) row"""
+        self.ids[pos] = source.ids[source_pos]
+        self.symbols[pos] = source.symbols[source_pos]
+
+    def clear(self):
+        """Remove all columns, keeping the row object"""
+        del self.ids[:]
+        del self.symbols[:]
+
+    def clear_column(self, pos: int):
+        """Reset a column to an empty one"""
+        self.ids[pos] = NO_COMMIT
+        self.symbols[pos] = 0
 
 
-@dataclass
 class Commit:
-    """Git commit data"""
-    hash: str
-    short_hash: str
-    parents: List[str]
-    author: str
-    date: str
-    timezone: str
-    message: str
-    refs: List[str]
+    """Git commit data.
+
+    A plain slotted class rather than a dataclass: one is built for every
+    commit, and importing dataclasses alone costs more than a small log.
+    """
+    __slots__ = ('hash', 'short_hash', 'parents', 'author', 'date', 'timezone', 'message', 'refs',
+                 'id', 'parent_ids', 'is_boundary')
+
+    def __init__(self, hash: str, short_hash: str, parents: List[str], author: str, date: str,
+                 timezone: str, message: str, refs: List[str],
+                 id: int = NO_COMMIT, parent_ids: Optional[List[int]] = None, is_boundary: bool = False):
+        self.hash = hash
+        self.short_hash = short_hash
+        self.parents = parents
+        self.author = author
+        self.date = date
+        self.timezone = timezone
+        self.message = message
+        self.refs = refs
+        self.id = id  # Interned commit ID used by the graph
+        self.parent_ids = [] if parent_ids is None else parent_ids
+        self.is_boundary = is_boundary  # Excluded by the revision range, shown by --boundary
+
+    def __eq__(self, other):
+        if not isinstance(other, Commit):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'Commit({fields})'
+
+
+class CommitStore:
+    """A compact, append-only sequence of commits.
+
+    A Commit object costs several hundred bytes: its __dict__, two hash
+    strings, two lists and the strings they hold. The store keeps each
+    field in a column instead: hashes as packed bytes, parents as slices
+    of shared arrays (found through an array of end offsets), authors and
+    time zones interned, dates as fixed-width bytes and messages as one
+    UTF-8 buffer. Commit objects are only built when an entry is read,
+    with short_hash cut from the hash then.
+
+    Entries are indexed from the first commit ever appended. release()
+    drops the ones already consumed, so a stream can be buffered without
+    holding the whole history.
+    """
+
+    DATE_WIDTH = 16  # Bytes of 'YYYY-MM-DD HH:MM', see TigStyleRendererV2._parse_date
+
+    def __init__(self):
+        self.start = 0  # Index of the first entry not released
+        self.base = 0  # Index of the first entry still in the columns
+        self.hash_len = 0  # Bytes per hash, set by the first commit
+        self.hashes = bytearray()
+        self.ids = array('i')
+        self.parent_ends = array('Q')  # End of each commit's parents in parent_hashes/parent_ids
+        self.parent_hashes = bytearray()
+        self.parent_ids = array('i')
+        self.authors = []  # Interned names, in order of appearance
+        self.author_index = {}
+        self.author_ids = array('I')
+        self.timezones = []
+        self.timezone_index = {}
+        self.timezone_ids = array('I')
+        self.dates = bytearray()
+        self.odd_dates = {}  # Index -> date that isn't DATE_WIDTH bytes long
+        self.message_ends = array('Q')
+        self.messages = bytearray()
+        self.refs = {}  # Index -> ref names, only for the commits that have some
+        self.boundary = bytearray()
+
+    def __len__(self) -> int:
+        """Number of commits ever appended, including released ones"""
+        return self.base + len(self.ids)
+
+    @staticmethod
+    def intern(strings: List[str], index: dict, string: str) -> int:
+        number = index.get(string)
+        if number is None:
+            number = index[string] = len(strings)
+            strings.append(string)
+        return number
+
+    def append(self, commit: Commit):
+        """Add a commit at the end"""
+        if not self.hash_len:
+            self.hash_len = len(commit.hash) // 2
+        position = len(self)
+        self.hashes += bytes.fromhex(commit.hash)
+        self.ids.append(commit.id)
+        self.parent_hashes += bytes.fromhex(''.join(commit.parents))
+        self.parent_ids.extend(commit.parent_ids)
+        self.parent_ends.append(len(self.parent_ids))
+        self.author_ids.append(self.intern(self.authors, self.author_index, commit.author))
+        self.timezone_ids.append(self.intern(self.timezones, self.timezone_index, commit.timezone))
+
+        date = commit.date.encode('utf-8', 'surrogatepass')
+        if len(date) != self.DATE_WIDTH:
+            self.odd_dates[position] = commit.date
+            date = bytes(self.DATE_WIDTH)
+        self.dates += date
+
+        self.messages += commit.message.encode('utf-8', 'surrogatepass')
+        self.message_ends.append(len(self.messages))
+        if commit.refs:
+            self.refs[position] = commit.refs
+        self.boundary.append(commit.is_boundary)
+
+    def extend(self, commits: Iterable[Commit]):
+        for commit in commits:
+            self.append(commit)
+
+    def extend_store(self, other: CommitStore, start: int, stop: int):
+        """Append the commits other[start:stop] by copying column slices"""
+        if not self.hash_len:
+            self.hash_len = other.hash_len
+        position = len(self)
+        first, last = start - other.base, stop - other.base
+        size = other.hash_len
+        parents_start = other.parent_ends[first - 1] if first else 0
+        parents_end = other.parent_ends[last - 1] if last else 0
+        messages_start = other.message_ends[first - 1] if first else 0
+
+        self.hashes += other.hashes[first * size:last * size]
+        self.ids += other.ids[first:last]
+        shift = len(self.parent_ids) - parents_start
+        self.parent_ends += array('Q', map(shift.__add__, other.parent_ends[first:last]))
+        self.parent_hashes += other.parent_hashes[parents_start * size:parents_end * size]
+        self.parent_ids += other.parent_ids[parents_start:parents_end]
+        authors = [self.intern(self.authors, self.author_index, name) for name in other.authors]
+        self.author_ids += array('I', map(authors.__getitem__, other.author_ids[first:last]))
+        timezones = [self.intern(self.timezones, self.timezone_index, name) for name in other.timezones]
+        self.timezone_ids += array('I', map(timezones.__getitem__, other.timezone_ids[first:last]))
+        self.dates += other.dates[first * self.DATE_WIDTH:last * self.DATE_WIDTH]
+        shift = len(self.messages) - messages_start
+        self.message_ends += array('Q', map(shift.__add__, other.message_ends[first:last]))
+        self.messages += other.messages[messages_start:other.message_ends[last - 1] if last else 0]
+        self.boundary += other.boundary[first:last]
+        shift = position - start
+        for table, other_table in ((self.odd_dates, other.odd_dates), (self.refs, other.refs)):
+            table.update((index + shift, value) for index, value in other_table.items() if start <= index < stop)
+
+    def __getitem__(self, index):
+        """The Commit at an index, or a list of Commits for a slice"""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        row = index - self.base
+        if not self.start <= index < len(self):
+            raise IndexError('commit not in store')
+
+        size = self.hash_len
+        commit_hash = self.hashes[row * size:(row + 1) * size].hex()
+        start = self.parent_ends[row - 1] if row else 0
+        end = self.parent_ends[row]
+        parents = self.parent_hashes[start * size:end * size].hex()
+        width = 2 * size
+        date = self.odd_dates.get(index)
+        if date is None:
+            date = self.dates[row * self.DATE_WIDTH:(row + 1) * self.DATE_WIDTH].decode('utf-8', 'surrogatepass')
+        message_start = self.message_ends[row - 1] if row else 0
+
+        return Commit(
+            hash=commit_hash,
+            short_hash=commit_hash[:SHORT_HASH_LENGTH],
+            parents=[parents[i:i + width] for i in range(0, len(parents), width)],
+            author=self.authors[self.author_ids[row]],
+            date=date,
+            timezone=self.timezones[self.timezone_ids[row]],
+            message=self.messages[message_start:self.message_ends[row]].decode('utf-8', 'surrogatepass'),
+            refs=self.refs.get(index, []),
+            id=self.ids[row],
+            parent_ids=self.parent_ids[start:end].tolist(),
+            is_boundary=bool(self.boundary[row])
+        )
+
+    def __iter__(self) -> Iterator[Commit]:
+        """The commits not released yet"""
+        for index in range(self.start, len(self)):
+            yield self[index]
+
+    def drain(self) -> Iterator[Commit]:
+        """Yield the commits not released yet, releasing each one read"""
+        while self.start < len(self):
+            commit = self[self.start]
+            self.release(self.start + 1)
+            yield commit
+
+    def release(self, upto: int):
+        """Forget the commits before index `upto`.
+
+        Their rows are only cut out of the columns once they make up half
+        of the store, so releasing one commit at a time stays O(1)
+        amortized.
+        """
+        self.start = max(self.start, min(upto, len(self)))
+        rows = self.start - self.base
+        if rows <= 0 or rows * 2 < len(self.ids):
+            return
+
+        size = self.hash_len
+        parents = self.parent_ends[rows - 1]
+        message_bytes = self.message_ends[rows - 1]
+        del self.hashes[:rows * size]
+        del self.ids[:rows]
+        del self.parent_hashes[:parents * size]
+        del self.parent_ids[:parents]
+        self.parent_ends = array('Q', [end - parents for end in self.parent_ends[rows:]])
+        del self.author_ids[:rows]
+        del self.timezone_ids[:rows]
+        del self.dates[:rows * self.DATE_WIDTH]
+        del self.messages[:message_bytes]
+        self.message_ends = array('Q', [end - message_bytes for end in self.message_ends[rows:]])
+        del self.boundary[:rows]
+        self.base = self.start
+        self.odd_dates = {i: date for i, date in self.odd_dates.items() if i >= self.base}
+        self.refs = {i: refs for i, refs in self.refs.items() if i >= self.base}
 
 
 class TigGraphV2:
-    """Exact replication of Tig's graph-v2.c algorithm"""
+    """Exact replication of Tig's graph-v2.c algorithm.
+
+    Commits are identified by small interned integers rather than SHA1
+    strings; NO_COMMIT marks free columns.
+    """
 
     GRAPH_COLORS = 14
+    OVERFLOW_GLYPH = ' ┆'  # Marker column standing for the folded columns
 
     def __init__(self):
         self.row = GraphRow()
@@ -97,17 +371,17 @@ class TigGraphV2:
         self.position = 0
         self.prev_position = 0
         self.expanded = 0
-        self.id = ""
+        self.id = NO_COMMIT
         self.has_parents = False
         self.is_boundary = False
         self.colors_map = {}  # Maps ID to color
         self.colors_count = [0] * self.GRAPH_COLORS
+        self.max_columns = 0  # Columns kept, 0 for no limit (see fold_columns)
+        self.folded = set()  # IDs waited for by the columns folded away
+        self.steady = None  # (lane, symbols) while linear commits repeat a row, see step_steady
 
-    def get_color(self, commit_id: Optional[str]) -> int:
-        """Get color for commit ID"""
-        if not commit_id:
-            commit_id = ""
-
+    def get_color(self, commit_id: int) -> int:
+        """Get color for commit ID (NO_COMMIT has a color of its own)"""
         if commit_id in self.colors_map:
             return self.colors_map[commit_id]
 
@@ -117,54 +391,40 @@ class TigGraphV2:
         self.colors_count[free_color] += 1
         return free_color
 
-    def remove_color(self, commit_id: str):
+    def remove_color(self, commit_id: int):
         """Remove color mapping for commit ID"""
         if commit_id in self.colors_map:
             color = self.colors_map[commit_id]
             self.colors_count[color] -= 1
             del self.colors_map[commit_id]
 
-    def column_has_commit(self, column: GraphColumn) -> bool:
-        """Check if column has a commit"""
-        return column.id is not None
-
-    def find_column_by_id(self, row: GraphRow, commit_id: str) -> int:
-        """Find column by commit ID"""
-        free_column = row.size
+    def column_has_commit(self, commit_id: int) -> bool:
+        """Check if a column id refers to a commit"""
+        return commit_id != NO_COMMIT
 
-        for i in range(row.size):
-            if not self.column_has_commit(row.columns[i]) and free_column == row.size:
-                free_column = i
-            elif row.columns[i].id == commit_id:
-                return i
-
-        return free_column
+    def find_column_by_id(self, row: GraphRow, commit_id: int) -> int:
+        """Find column by commit ID, or the first free column"""
+        if commit_id in row.ids:
+            return row.ids.index(commit_id)
+        return self.find_free_column(row)
 
     def find_free_column(self, row: GraphRow) -> int:
         """Find first free column"""
-        for i in range(row.size):
-            if not self.column_has_commit(row.columns[i]):
-                return i
+        if NO_COMMIT in row.ids:
+            return row.ids.index(NO_COMMIT)
         return row.size
 
-    def insert_column(self, row: GraphRow, pos: int, commit_id: Optional[str]) -> Optional[GraphColumn]:
-        """Insert a column at position"""
-        column = GraphColumn()
-        column.id = commit_id
-        column.symbol.boundary = self.is_boundary
-
-        if pos < row.size:
-            row.columns.insert(pos, column)
-        else:
-            row.columns.append(column)
-
-        return column
+    def insert_column(self, row: GraphRow, pos: int, commit_id: int) -> bool:
+        """Insert a column at position (appending if pos is past the end)"""
+        row.ids.insert(pos, commit_id)
+        row.symbols.insert(pos, GraphSymbol.BOUNDARY if self.is_boundary else 0)
+        return True
 
-    def add_parent(self, parent: Optional[str]) -> bool:
+    def add_parent(self, parent: int) -> bool:
         """Add a parent to the parents list"""
         if self.has_parents:
             return True
-        return self.insert_column(self.parents, self.parents.size, parent) is not None
+        return self.insert_column(self.parents, self.parents.size, parent)
 
     def needs_expansion(self) -> bool:
         """Check if we need to expand columns"""
@@ -173,85 +433,83 @@ class TigGraphV2:
     def expand(self) -> bool:
         """Expand columns to fit parents"""
         while self.needs_expansion():
-            if not self.insert_column(self.prev_row, self.prev_row.size, None):
+            if not self.insert_column(self.prev_row, self.prev_row.size, NO_COMMIT):
                 return False
-            if not self.insert_column(self.row, self.row.size, None):
+            if not self.insert_column(self.row, self.row.size, NO_COMMIT):
                 return False
-            if not self.insert_column(self.next_row, self.next_row.size, None):
+            if not self.insert_column(self.next_row, self.next_row.size, NO_COMMIT):
                 return False
         return True
 
     def needs_collapsing(self) -> bool:
         """Check if we need to collapse"""
         return (self.row.size > 1 and
-                not self.column_has_commit(self.row.columns[self.row.size - 1]))
+                not self.column_has_commit(self.row.ids[self.row.size - 1]))
 
     def collapse(self) -> bool:
         """Remove empty trailing columns"""
         while self.needs_collapsing():
-            self.prev_row.columns.pop()
-            self.row.columns.pop()
-            self.next_row.columns.pop()
+            for row in (self.prev_row, self.row, self.next_row):
+                row.ids.pop()
+                row.symbols.pop()
         return True
 
-    def row_clear_commit(self, row: GraphRow, commit_id: str):
+    def row_clear_commit(self, row: GraphRow, commit_id: int):
         """Clear commit from row"""
-        for i in range(row.size):
-            if row.columns[i].id == commit_id:
-                row.columns[i].id = None
+        ids = row.ids
+        while commit_id in ids:
+            ids[ids.index(commit_id)] = NO_COMMIT
 
-    def commit_is_in_row(self, commit_id: str, row: GraphRow) -> bool:
+    def commit_is_in_row(self, commit_id: int, row: GraphRow) -> bool:
         """Check if commit is in row"""
-        for i in range(row.size):
-            if self.column_has_commit(row.columns[i]) and row.columns[i].id == commit_id:
-                return True
-        return False
+        return self.column_has_commit(commit_id) and commit_id in row.ids
 
     def insert_parents(self):
         """Insert parents into next_row"""
         for i in range(self.parents.size):
-            new = self.parents.columns[i]
+            new_id = self.parents.ids[i]
 
-            if self.column_has_commit(new):
+            if self.column_has_commit(new_id):
                 match = self.find_free_column(self.next_row)
 
-                if match == self.next_row.size and self.column_has_commit(self.next_row.columns[self.next_row.size - 1]):
-                    self.insert_column(self.next_row, self.next_row.size, new.id)
-                    self.insert_column(self.row, self.row.size, None)
-                    self.insert_column(self.prev_row, self.prev_row.size, None)
+                if match == self.next_row.size and self.column_has_commit(self.next_row.ids[self.next_row.size - 1]):
+                    self.insert_column(self.next_row, self.next_row.size, new_id)
+                    self.insert_column(self.row, self.row.size, NO_COMMIT)
+                    self.insert_column(self.prev_row, self.prev_row.size, NO_COMMIT)
                 else:
-                    self.next_row.columns[match].id = new.id
-                    self.next_row.columns[match].symbol = GraphSymbol(**vars(new.symbol))
+                    self.next_row.copy_column(match, self.parents, i)
 
     def remove_collapsed_columns(self):
         """Remove collapsed columns from next_row"""
         row = self.next_row
+        ids = row.ids
+        prev_ids = self.prev_row.ids
 
         for i in range(row.size - 1, 0, -1):
             if i == self.position:
                 continue
             if i == self.position + 1:
                 continue
-            if row.columns[i].id == self.id:
+            if ids[i] == self.id:
                 continue
-            if row.columns[i].id != row.columns[i - 1].id:
+            if ids[i] != ids[i - 1]:
                 continue
-            if self.commit_is_in_row(row.columns[i].id, self.parents) and not self.column_has_commit(self.prev_row.columns[i]):
+            if self.commit_is_in_row(ids[i], self.parents) and not self.column_has_commit(prev_ids[i]):
                 continue
 
-            if row.columns[i - 1].id != self.prev_row.columns[i - 1].id or self.prev_row.columns[i - 1].symbol.shift_left:
+            if ids[i - 1] != prev_ids[i - 1] or self.prev_row.symbols[i - 1] & GraphSymbol.SHIFT_LEFT:
                 if i + 1 >= row.size:
-                    row.columns[i] = GraphColumn()
+                    row.clear_column(i)
                 else:
-                    row.columns[i] = GraphColumn(**vars(row.columns[i + 1]))
+                    row.copy_column(i, row, i + 1)
 
     def fill_empty_columns(self):
         """Fill empty columns in next_row"""
         row = self.next_row
 
         for i in range(row.size - 2, -1, -1):
-            if not self.column_has_commit(row.columns[i]):
-                row.columns[i] = GraphColumn(**vars(row.columns[i + 1]))
+            if not self.column_has_commit(row.ids[i]):
+                row.copy_column(i, row, i + 1)
 
     def generate_next_row(self):
         """Generate the next row"""
@@ -262,46 +520,51 @@ class TigGraphV2:
 
     def commits_in_row(self, row: GraphRow) -> int:
         """Count commits in row"""
-        count = 0
-        for i in range(row.size):
-            if self.column_has_commit(row.columns[i]):
-                count += 1
-        return count
+        return row.size - row.ids.count(NO_COMMIT)
 
     def commit_next_row(self):
-        """Commit the next row to current row"""
-        for i in range(self.row.size):
-            self.prev_row.columns[i] = GraphColumn(**vars(self.row.columns[i]))
+        """Commit the next row to current row.
 
-            if i == self.position and self.commits_in_row(self.parents) > 0:
-                self.prev_row.columns[i] = GraphColumn(**vars(self.next_row.columns[i]))
+        The three rows are rotating buffers: the current row becomes
+        prev_row as is, and the old prev_row buffer is overwritten in place
+        with next_row. Only the prev_row columns that take next_row's value
+        (free columns and the commit's own column) are patched one by one.
+        """
+        self.prev_row, self.row = self.row, self.prev_row
+        prev_row, next_row = self.prev_row, self.next_row
 
-            if not self.column_has_commit(self.prev_row.columns[i]):
-                self.prev_row.columns[i] = GraphColumn(**vars(self.next_row.columns[i]))
+        patched = [i for i, commit_id in enumerate(prev_row.ids) if commit_id == NO_COMMIT]
+        if self.commits_in_row(self.parents) > 0:
+            patched.append(self.position)
+        for i in patched:
+            prev_row.copy_column(i, next_row, i)
 
-            self.row.columns[i] = GraphColumn(**vars(self.next_row.columns[i]))
+        self.row.ids[:] = next_row.ids
+        self.row.symbols[:] = next_row.symbols
 
         self.prev_position = self.position
 
-    # Symbol detection functions
+    # Symbol detection functions. These are the reference definitions of
+    # the flags; generate_symbols() answers them from per-row indexes.
 
     def continued_down(self, row: GraphRow, next_row: GraphRow, pos: int) -> bool:
         """Check if line continues down"""
-        if row.columns[pos].id != next_row.columns[pos].id:
+        if row.ids[pos] != next_row.ids[pos]:
             return False
-        if row.columns[pos].symbol.shift_left:
+        if row.symbols[pos] & GraphSymbol.SHIFT_LEFT:
             return False
         return True
 
     def shift_left(self, row: GraphRow, prev_row: GraphRow, pos: int) -> bool:
         """Check if position shifts left"""
-        if not self.column_has_commit(row.columns[pos]):
+        ids = row.ids
+        if not self.column_has_commit(ids[pos]):
             return False
 
         for i in range(pos - 1, -1, -1):
-            if not self.column_has_commit(row.columns[i]):
+            if not self.column_has_commit(ids[i]):
                 continue
-            if row.columns[i].id != row.columns[pos].id:
+            if ids[i] != ids[pos]:
                 continue
             if not self.continued_down(prev_row, row, i):
                 return True
@@ -311,14 +574,10 @@ class TigGraphV2:
 
     def new_column(self, row: GraphRow, prev_row: GraphRow, pos: int) -> bool:
         """Check if this is a new column"""
-        if not self.column_has_commit(prev_row.columns[pos]):
+        if not self.column_has_commit(prev_row.ids[pos]):
             return True
 
-        for i in range(pos, row.size):
-            if row.columns[pos].id == prev_row.columns[i].id:
-                return False
-
-        return True
+        return row.ids[pos] not in prev_row.ids[pos:row.size]
 
     def continued_right(self, row: GraphRow, pos: int, commit_pos: int) -> bool:
         """Check if line continues right"""
@@ -327,11 +586,7 @@ class TigGraphV2:
         else:
             end = row.size
 
-        for i in range(pos + 1, end):
-            if row.columns[pos].id == row.columns[i].id:
-                return True
-
-        return False
+        return row.ids[pos] in row.ids[pos + 1:end]
 
     def continued_left(self, row: GraphRow, pos: int, commit_pos: int) -> bool:
         """Check if line continues left"""
@@ -340,113 +595,224 @@ class TigGraphV2:
         else:
             start = commit_pos
 
-        for i in range(start, pos):
-            if not self.column_has_commit(row.columns[i]):
-                continue
-            if row.columns[pos].id == row.columns[i].id:
-                return True
-
-        return False
+        # Free columns never match
+        commit_id = row.ids[pos]
+        return self.column_has_commit(commit_id) and commit_id in row.ids[start:pos]
 
     def parent_down(self, parents: GraphRow, next_row: GraphRow, pos: int) -> bool:
         """Check if parent goes down"""
-        for parent in range(parents.size):
-            if not self.column_has_commit(parents.columns[parent]):
-                continue
-            if parents.columns[parent].id == next_row.columns[pos].id:
-                return True
-        return False
+        return self.commit_is_in_row(next_row.ids[pos], parents)
 
     def parent_right(self, parents: GraphRow, row: GraphRow, next_row: GraphRow, pos: int) -> bool:
         """Check if parent goes right"""
-        for parent in range(parents.size):
-            if not self.column_has_commit(parents.columns[parent]):
+        for parent in parents.ids:
+            if not self.column_has_commit(parent):
                 continue
 
             for i in range(pos + 1, next_row.size):
-                if parents.columns[parent].id != next_row.columns[i].id:
+                if parent != next_row.ids[i]:
                     continue
-                if parents.columns[parent].id != row.columns[i].id:
+                if parent != row.ids[i]:
                     return True
 
         return False
 
-    def flanked(self, row: GraphRow, pos: int, commit_pos: int, commit_id: str) -> bool:
+    def flanked(self, row: GraphRow, pos: int, commit_pos: int, commit_id: int) -> bool:
         """Check if position is flanked by commit"""
         if pos < commit_pos:
             start, end = 0, pos
         else:
             start, end = pos + 1, row.size
 
-        for i in range(start, end):
-            if row.columns[i].id == commit_id:
-                return True
-
-        return False
+        return commit_id in row.ids[start:end]
 
     def below_commit(self, pos: int) -> bool:
         """Check if position is below commit"""
         if pos != self.prev_position:
             return False
-        if self.row.columns[pos].id != self.prev_row.columns[pos].id:
+        if self.row.ids[pos] != self.prev_row.ids[pos]:
             return False
         return True
 
-    def generate_symbols(self, canvas_symbols: List[GraphSymbol]):
-        """Generate symbols for current row"""
+    def generate_symbols(self, canvas_symbols: List[int]):
+        """Generate symbols for current row.
+
+        Computes the same flags as the predicates above, but from indexes
+        built once per row (neighbouring occurrences of each column's ID,
+        first/last positions of IDs, a suffix marker for parent_right), so
+        each flag is an O(1) lookup and a row costs O(width) instead of
+        O(width²).
+        """
+        S = GraphSymbol
+        size = self.row.size
+        position = self.position
+        prev_position = self.prev_position
+        commit_id = self.id
+        row_ids = self.row.ids
+        prev_ids = self.prev_row.ids
+        next_ids = self.next_row.ids
+        row_symbols = self.row.symbols
+        prev_symbols = self.prev_row.symbols
+        colors_map = self.colors_map
+
         commits = self.commits_in_row(self.parents)
         initial = commits < 1
         merge = commits > 1
-
-        for pos in range(self.row.size):
-            column = self.row.columns[pos]
-            symbol = GraphSymbol()
-            commit_id = self.next_row.columns[pos].id
+        row_flags = (S.INITIAL if initial else 0) | (S.MERGE if merge else 0)
+
+        parents = set(self.parents.ids)
+        parents.discard(NO_COMMIT)
+
+        # Nearest other column with the same ID on each side, within row
+        same_before = [-1] * size
+        same_after = [size] * size
+        last_seen = {}
+        for pos, column_id in enumerate(row_ids):
+            before = last_seen.get(column_id)
+            if before is not None:
+                same_before[pos] = before
+                same_after[before] = pos
+            last_seen[column_id] = pos
+
+        # First/last positions of the commit in row, for flanked
+        commit_first = row_ids.index(commit_id) if commit_id in last_seen else size
+        commit_last = last_seen.get(commit_id, -1)
+
+        # Last positions in next_row (next_right) and prev_row (new_column),
+        # first positions in prev_row (continued_up_left)
+        next_last = {column_id: pos for pos, column_id in enumerate(next_ids)}
+        prev_last = {column_id: pos for pos, column_id in enumerate(prev_ids)}
+        prev_first = {column_id: pos for pos, column_id in reversed(list(enumerate(prev_ids)))}
+
+        # continued_down(prev_row, row, pos) for every column
+        continued_up = [prev_ids[pos] == row_ids[pos] and not prev_symbols[pos] & S.SHIFT_LEFT
+                        for pos in range(size)]
+
+        # shift_left: the nearest column to the left leading to the same
+        # commit didn't come straight down from the previous row
+        shift_left = [row_ids[pos] != NO_COMMIT and same_before[pos] >= 0 and not continued_up[same_before[pos]]
+                      for pos in range(size)]
+
+        # parent_right holds left of the last column where a parent enters
+        # next_row without being in row
+        parent_right_last = -1
+        for pos in range(size):
+            if next_ids[pos] in parents and next_ids[pos] != row_ids[pos]:
+                parent_right_last = pos
+
+        for pos in range(size):
+            column_id = row_ids[pos]
+            next_id = next_ids[pos]
+            prev_id = prev_ids[pos]
+            symbol = row_flags
 
             # Basic flags
-            symbol.commit = (pos == self.position)
-            symbol.boundary = (pos == self.position and self.next_row.columns[pos].symbol.boundary)
-            symbol.initial = initial
-            symbol.merge = merge
+            if pos == position:
+                symbol |= S.COMMIT
+                if self.next_row.symbols[pos] & S.BOUNDARY:
+                    symbol |= S.BOUNDARY
 
             # Continuation flags
-            symbol.continued_down = self.continued_down(self.row, self.next_row, pos)
-            symbol.continued_up = self.continued_down(self.prev_row, self.row, pos)
-            symbol.continued_right = self.continued_right(self.row, pos, self.position)
-            symbol.continued_left = self.continued_left(self.row, pos, self.position)
-            symbol.continued_up_left = self.continued_left(self.prev_row, pos, self.prev_row.size)
+            if column_id == next_id and not row_symbols[pos] & S.SHIFT_LEFT:
+                symbol |= S.CONTINUED_DOWN
+            if continued_up[pos]:
+                symbol |= S.CONTINUED_UP
+            if same_after[pos] < (position if pos < position else size):
+                symbol |= S.CONTINUED_RIGHT
+            if column_id != NO_COMMIT and same_before[pos] >= (0 if pos < position else position):
+                symbol |= S.CONTINUED_LEFT
+            if prev_id != NO_COMMIT and prev_first[prev_id] < pos:
+                symbol |= S.CONTINUED_UP_LEFT
 
             # Parent flags
-            symbol.parent_down = self.parent_down(self.parents, self.next_row, pos)
-            symbol.parent_right = (pos > self.position and self.parent_right(self.parents, self.row, self.next_row, pos))
+            if next_id in parents:
+                symbol |= S.PARENT_DOWN
+            if position < pos < parent_right_last:
+                symbol |= S.PARENT_RIGHT
 
             # Position flags
-            symbol.below_commit = self.below_commit(pos)
-            symbol.flanked = self.flanked(self.row, pos, self.position, self.id)
-            symbol.next_right = self.continued_right(self.next_row, pos, 0)
-            symbol.matches_commit = column.id == self.id
+            if pos == prev_position and column_id == prev_id:
+                symbol |= S.BELOW_COMMIT
+            if (commit_first < pos) if pos < position else (commit_last > pos):
+                symbol |= S.FLANKED
+            if next_last[next_id] > pos:
+                symbol |= S.NEXT_RIGHT
+            if column_id == commit_id:
+                symbol |= S.MATCHES_COMMIT
 
             # Shift flags
-            symbol.shift_left = self.shift_left(self.row, self.prev_row, pos)
-            symbol.continue_shift = self.shift_left(self.row, self.prev_row, pos + 1) if pos + 1 < self.row.size else False
-            symbol.below_shift = self.prev_row.columns[pos].symbol.shift_left
+            if shift_left[pos]:
+                symbol |= S.SHIFT_LEFT
+            if pos + 1 < size and shift_left[pos + 1]:
+                symbol |= S.CONTINUE_SHIFT
+            if prev_symbols[pos] & S.SHIFT_LEFT:
+                symbol |= S.BELOW_SHIFT
 
             # Column flags
-            symbol.new_column = self.new_column(self.row, self.prev_row, pos)
-            symbol.empty = not self.column_has_commit(self.row.columns[pos])
+            if prev_id == NO_COMMIT or prev_last.get(column_id, -1) < pos:
+                symbol |= S.NEW_COLUMN
+            if column_id == NO_COMMIT:
+                symbol |= S.EMPTY
 
             # Color
-            if self.column_has_commit(column):
-                commit_id = column.id
-            symbol.color = self.get_color(commit_id)
+            if column_id == NO_COMMIT:
+                column_id = next_id
+            color = colors_map.get(column_id)
+            if color is None:
+                color = self.get_color(column_id)
+            symbol |= color << S.COLOR_SHIFT
 
             canvas_symbols.append(symbol)
 
         self.remove_color(self.id)
 
-    def add_commit(self, commit_id: str, parent_ids: List[str], is_boundary: bool = False):
+    def get_state(self) -> dict:
+        """Snapshot the state carried from one commit to the next"""
+        rows = (self.prev_row, self.row, self.next_row)
+        return {
+            'rows': [list(row.ids) for row in rows],
+            'symbols': [list(row.symbols) for row in rows],
+            'prev_position': self.prev_position,
+            'colors_map': dict(self.colors_map),
+            'colors_count': list(self.colors_count),
+            'folded': list(self.folded),
+        }
+
+    def set_state(self, state: dict):
+        """Restore a snapshot taken by get_state()"""
+        self.prev_row, self.row, self.next_row = [
+            GraphRow(array('i', ids), array('i', symbols))
+            for ids, symbols in zip(state['rows'], state['symbols'])
+        ]
+        self.prev_position = state['prev_position']
+        self.colors_map = dict(state['colors_map'])
+        self.colors_count = list(state['colors_count'])
+        self.folded = set(state.get('folded', ()))
+        self.steady = None
+
+    def fold_columns(self, size: int):
+        """Drop the columns from `size` on, remembering what they wait for.
+
+        Not part of graph-v2.c: with max_columns set, the rows never grow
+        past it, so each row costs O(max_columns) however many branches are
+        live. A commit whose column was folded away shows up again as a
+        new column, without the line from its children.
+        """
+        for commit_id in self.row.ids[size:]:
+            if commit_id != NO_COMMIT:
+                self.folded.add(commit_id)
+        for row in (self.prev_row, self.row, self.next_row):
+            del row.ids[size:]
+            del row.symbols[size:]
+        self.steady = None
+
+    def add_commit(self, commit_id: int, parent_ids: List[int], is_boundary: bool = False):
         """Add a commit to the graph"""
         self.position = self.find_column_by_id(self.row, commit_id)
+        # With max_columns, a commit finding no free column gets a new one
+        # right of them, drawn in place of the overflow marker and folded
+        # away after its row
+        self.folded.discard(commit_id)
         self.id = commit_id
         self.is_boundary = is_boundary
         self.has_parents = False
@@ -462,12 +828,24 @@ class TigGraphV2:
 
         return True
 
-    def render_parents(self, canvas_symbols: List[GraphSymbol]) -> bool:
+    def render_parents(self, canvas_symbols: List[int]) -> bool:
         """Render the graph"""
+        if self.steady and self.step_steady(canvas_symbols):
+            return True
+        self.steady = None
+
         if self.parents.size == 0:
-            if not self.add_parent(None):
+            if not self.add_parent(NO_COMMIT):
                 return False
 
+        # A linear commit may leave every row as it found it, but for its
+        # own column moving on to its parent (see step_steady)
+        linear = self.parents.size == 1 and not self.is_boundary
+        if linear:
+            commit_id, parent_id = self.id, self.parents.ids[0]
+            rows = [(row.ids[:], row.symbols[:]) for row in (self.prev_row, self.row, self.next_row)]
+            before = (self.prev_position, rows, self.colors_count[:])
+
         if not self.expand():
             return False
 
@@ -475,24 +853,113 @@ class TigGraphV2:
         self.generate_symbols(canvas_symbols)
         self.commit_next_row()
 
-        self.parents = GraphRow()
+        self.parents.clear()
         self.position = 0
 
         if not self.collapse():
             return False
 
+        if self.max_columns:
+            # The parents of the last commit may spill over for one row; a
+            # commit in the overflow column keeps its own symbol
+            del canvas_symbols[max(self.max_columns, self.prev_position + 1):]
+            if self.row.size > self.max_columns:
+                self.fold_columns(self.max_columns)
+
+        if linear and self.is_steady(before, commit_id, parent_id):
+            self.steady = (self.prev_position, canvas_symbols[:])
+        return True
+
+    def is_steady(self, before: tuple, commit_id: int, parent_id: int) -> bool:
+        """Whether the linear commit just laid out changed nothing but its column.
+
+        `before` is (prev_position, (ids, symbols) of the three rows,
+        colors_count) from before the commit. It is steady if it was laid
+        out right below the previous commit, the rows only differ in its
+        column, where it became its parent in all three, and neither of the
+        two is anywhere else in the rows, the colors or the folded columns:
+        every other ID kept its place and color.
+        """
+        prev_position, rows, colors_count = before
+        lane = self.prev_position
+        if prev_position != lane:
+            return False
+        for row, (ids, symbols) in zip((self.prev_row, self.row, self.next_row), rows):
+            if (row.symbols != symbols or len(ids) != len(row.ids) or lane >= len(ids) or
+                    ids[lane] != commit_id or
+                    row.ids[lane] != parent_id or row.ids[:lane] != ids[:lane] or
+                    row.ids[lane + 1:] != ids[lane + 1:] or row.ids.count(parent_id) != 1 or
+                    commit_id in row.ids):
+                return False
+        return (self.colors_count == colors_count and commit_id not in self.colors_map and
+                parent_id not in self.colors_map and commit_id not in self.folded and
+                parent_id not in self.folded)
+
+    def step_steady(self, canvas_symbols: List[int]) -> bool:
+        """Lay out a linear commit continuing a steady lane without generating its row.
+
+        After a steady commit (see is_steady), the rows are the ones it
+        found with other IDs in its column. A linear commit taking that
+        column over, whose parent is nowhere else either, meets the same
+        rows up to renaming, so its row has the same symbols and it leaves
+        the rows steady again. Returns False, having changed nothing, for
+        any other commit.
+        """
+        lane, symbols = self.steady
+        commit_id = self.id
+        rows = (self.prev_row, self.row, self.next_row)
+        if self.position != lane or self.parents.size != 1 or self.is_boundary:
+            return False
+        parent_id = self.parents.ids[0]
+        if (parent_id == NO_COMMIT or commit_id in self.colors_map or parent_id in self.colors_map or
+                commit_id in self.folded or parent_id in self.folded):
+            return False
+        for row in rows:
+            if (lane >= len(row.ids) or row.ids[lane] != commit_id or
+                    row.ids.count(commit_id) != 1 or parent_id in row.ids):
+                return False
+
+        for row in rows:
+            row.ids[lane] = parent_id
+        canvas_symbols += symbols
+        self.parents.clear()
+        self.position = 0
         return True
 
     # Symbol to character conversion functions (matching graph-v2.c exactly)
 
-    def symbol_to_utf8(self, symbol: GraphSymbol) -> str:
+    def symbols_to_box(self, canvas_symbols: List[int]) -> str:
+        """Convert a row of symbols to box-drawing characters"""
+        return ''.join(self.symbol_to_box(symbol) for symbol in canvas_symbols)
+
+    # Glyphs memoized by symbol flag bits, shared by all graphs
+    utf8_glyphs = {}
+    box_glyphs = {}
+
+    def symbol_to_utf8(self, symbol: int) -> str:
         """Convert symbol to UTF-8 characters (rounded corners)"""
-        if symbol.commit:
-            if symbol.boundary:
+        flags = symbol & GraphSymbol.FLAGS_MASK
+        glyph = self.utf8_glyphs.get(flags)
+        if glyph is None:
+            glyph = self.utf8_glyphs[flags] = self.lookup_utf8(flags)
+        return glyph
+
+    def symbol_to_box(self, symbol: int) -> str:
+        """Convert symbol to standard box-drawing characters (matching Tig chtype output)"""
+        flags = symbol & GraphSymbol.FLAGS_MASK
+        glyph = self.box_glyphs.get(flags)
+        if glyph is None:
+            glyph = self.box_glyphs[flags] = self.lookup_box(flags)
+        return glyph
+
+    def lookup_utf8(self, symbol: int) -> str:
+        """Choose the UTF-8 glyph for a symbol from its flags"""
+        if symbol & GraphSymbol.COMMIT:
+            if symbol & GraphSymbol.BOUNDARY:
                 return ' ◯'
-            elif symbol.initial:
+            elif symbol & GraphSymbol.INITIAL:
                 return ' ◎'
-            elif symbol.merge:
+            elif symbol & GraphSymbol.MERGE:
                 return ' ●'
             return ' ∙'
 
@@ -523,14 +990,14 @@ class TigGraphV2:
 
         return '  '
 
-    def symbol_to_box(self, symbol: GraphSymbol) -> str:
-        """Convert symbol to standard box-drawing characters (matching Tig chtype output)"""
-        if symbol.commit:
-            if symbol.boundary:
+    def lookup_box(self, symbol: int) -> str:
+        """Choose the box-drawing glyph for a symbol from its flags"""
+        if symbol & GraphSymbol.COMMIT:
+            if symbol & GraphSymbol.BOUNDARY:
                 return ' o'
-            elif symbol.initial:
+            elif symbol & GraphSymbol.INITIAL:
                 return ' I'
-            elif symbol.merge:
+            elif symbol & GraphSymbol.MERGE:
                 return ' M'
             return ' o'
 
@@ -561,305 +1028,2765 @@ class TigGraphV2:
 
         return '  '
 
-    def symbol_forks(self, symbol: GraphSymbol) -> bool:
-        return (symbol.continued_down and symbol.continued_right and symbol.continued_up)
+    def symbol_forks(self, symbol: int) -> bool:
+        return bool(symbol & GraphSymbol.CONTINUED_DOWN and symbol & GraphSymbol.CONTINUED_RIGHT and
+                    symbol & GraphSymbol.CONTINUED_UP)
 
-    def symbol_cross_merge(self, symbol: GraphSymbol) -> bool:
-        if symbol.empty:
+    def symbol_cross_merge(self, symbol: int) -> bool:
+        if symbol & GraphSymbol.EMPTY:
             return False
-        if not symbol.continued_up and not symbol.new_column and not symbol.below_commit:
+        if not symbol & GraphSymbol.CONTINUED_UP and not symbol & GraphSymbol.NEW_COLUMN and not symbol & GraphSymbol.BELOW_COMMIT:
             return False
-        if symbol.shift_left and symbol.continued_up_left:
+        if symbol & GraphSymbol.SHIFT_LEFT and symbol & GraphSymbol.CONTINUED_UP_LEFT:
             return False
-        if symbol.next_right:
+        if symbol & GraphSymbol.NEXT_RIGHT:
             return False
-        if (symbol.merge and symbol.continued_up and symbol.continued_right and
-            symbol.continued_left and symbol.parent_down and not symbol.next_right):
+        if (symbol & GraphSymbol.MERGE and symbol & GraphSymbol.CONTINUED_UP and symbol & GraphSymbol.CONTINUED_RIGHT and
+            symbol & GraphSymbol.CONTINUED_LEFT and symbol & GraphSymbol.PARENT_DOWN and not symbol & GraphSymbol.NEXT_RIGHT):
             return True
         return False
 
-    def symbol_vertical_merge(self, symbol: GraphSymbol) -> bool:
+    def symbol_vertical_merge(self, symbol: int) -> bool:
         """This is the KEY function for M─┤ detection"""
-        if symbol.empty:
+        if symbol & GraphSymbol.EMPTY:
             return False
-        if not symbol.continued_up and not symbol.new_column and not symbol.below_commit:
+        if not symbol & GraphSymbol.CONTINUED_UP and not symbol & GraphSymbol.NEW_COLUMN and not symbol & GraphSymbol.BELOW_COMMIT:
             return False
-        if symbol.shift_left and symbol.continued_up_left:
+        if symbol & GraphSymbol.SHIFT_LEFT and symbol & GraphSymbol.CONTINUED_UP_LEFT:
             return False
-        if symbol.next_right:
+        if symbol & GraphSymbol.NEXT_RIGHT:
             return False
-        if not symbol.matches_commit:
+        if not symbol & GraphSymbol.MATCHES_COMMIT:
             return False
-        if (symbol.merge and symbol.continued_up and symbol.continued_left and
-            symbol.parent_down and not symbol.continued_right):
+        if (symbol & GraphSymbol.MERGE and symbol & GraphSymbol.CONTINUED_UP and symbol & GraphSymbol.CONTINUED_LEFT and
+            symbol & GraphSymbol.PARENT_DOWN and not symbol & GraphSymbol.CONTINUED_RIGHT):
             return True
         return False
 
-    def symbol_cross_over(self, symbol: GraphSymbol) -> bool:
-        if symbol.empty:
+    def symbol_cross_over(self, symbol: int) -> bool:
+        if symbol & GraphSymbol.EMPTY:
             return False
-        if not symbol.continued_down:
+        if not symbol & GraphSymbol.CONTINUED_DOWN:
             return False
-        if not symbol.continued_up and not symbol.new_column and not symbol.below_commit:
+        if not symbol & GraphSymbol.CONTINUED_UP and not symbol & GraphSymbol.NEW_COLUMN and not symbol & GraphSymbol.BELOW_COMMIT:
             return False
-        if symbol.shift_left:
+        if symbol & GraphSymbol.SHIFT_LEFT:
             return False
-        if symbol.parent_right and symbol.merge:
+        if symbol & GraphSymbol.PARENT_RIGHT and symbol & GraphSymbol.MERGE:
             return True
-        if symbol.flanked:
+        if symbol & GraphSymbol.FLANKED:
             return True
         return False
 
-    def symbol_turn_left(self, symbol: GraphSymbol) -> bool:
-        if symbol.matches_commit and symbol.continued_right and not symbol.continued_down:
+    def symbol_turn_left(self, symbol: int) -> bool:
+        if symbol & GraphSymbol.MATCHES_COMMIT and symbol & GraphSymbol.CONTINUED_RIGHT and not symbol & GraphSymbol.CONTINUED_DOWN:
             return False
-        if symbol.continue_shift:
+        if symbol & GraphSymbol.CONTINUE_SHIFT:
             return False
-        if symbol.continued_up or symbol.new_column or symbol.below_commit:
-            if symbol.matches_commit:
+        if symbol & GraphSymbol.CONTINUED_UP or symbol & GraphSymbol.NEW_COLUMN or symbol & GraphSymbol.BELOW_COMMIT:
+            if symbol & GraphSymbol.MATCHES_COMMIT:
                 return True
-            if symbol.shift_left:
+            if symbol & GraphSymbol.SHIFT_LEFT:
                 return True
         return False
 
-    def symbol_turn_down_cross_over(self, symbol: GraphSymbol) -> bool:
-        if not symbol.continued_down:
+    def symbol_turn_down_cross_over(self, symbol: int) -> bool:
+        if not symbol & GraphSymbol.CONTINUED_DOWN:
             return False
-        if not symbol.continued_right:
+        if not symbol & GraphSymbol.CONTINUED_RIGHT:
             return False
-        if not symbol.parent_right and not symbol.flanked:
+        if not symbol & GraphSymbol.PARENT_RIGHT and not symbol & GraphSymbol.FLANKED:
             return False
-        if symbol.flanked:
+        if symbol & GraphSymbol.FLANKED:
             return True
-        if symbol.merge:
+        if symbol & GraphSymbol.MERGE:
             return True
         return False
 
-    def symbol_turn_down(self, symbol: GraphSymbol) -> bool:
-        return symbol.continued_down and symbol.continued_right
+    def symbol_turn_down(self, symbol: int) -> bool:
+        return bool(symbol & GraphSymbol.CONTINUED_DOWN and symbol & GraphSymbol.CONTINUED_RIGHT)
 
-    def symbol_merge(self, symbol: GraphSymbol) -> bool:
-        return (not symbol.continued_down and symbol.parent_down and
-                not symbol.parent_right and not symbol.continued_right)
+    def symbol_merge(self, symbol: int) -> bool:
+        return bool(not symbol & GraphSymbol.CONTINUED_DOWN and symbol & GraphSymbol.PARENT_DOWN and
+                    not symbol & GraphSymbol.PARENT_RIGHT and not symbol & GraphSymbol.CONTINUED_RIGHT)
 
-    def symbol_multi_merge(self, symbol: GraphSymbol) -> bool:
-        if not symbol.parent_down:
+    def symbol_multi_merge(self, symbol: int) -> bool:
+        if not symbol & GraphSymbol.PARENT_DOWN:
             return False
-        if not symbol.parent_right and not symbol.continued_right:
+        if not symbol & GraphSymbol.PARENT_RIGHT and not symbol & GraphSymbol.CONTINUED_RIGHT:
             return False
         return True
 
-    def symbol_vertical_bar(self, symbol: GraphSymbol) -> bool:
-        if symbol.empty:
+    def symbol_vertical_bar(self, symbol: int) -> bool:
+        if symbol & GraphSymbol.EMPTY:
             return False
-        if symbol.shift_left:
+        if symbol & GraphSymbol.SHIFT_LEFT:
             return False
-        if not symbol.continued_down:
+        if not symbol & GraphSymbol.CONTINUED_DOWN:
             return False
-        if symbol.continued_up:
+        if symbol & GraphSymbol.CONTINUED_UP:
             return True
-        if symbol.parent_right:
+        if symbol & GraphSymbol.PARENT_RIGHT:
             return False
-        if symbol.flanked:
+        if symbol & GraphSymbol.FLANKED:
             return False
-        if symbol.continued_right:
+        if symbol & GraphSymbol.CONTINUED_RIGHT:
             return False
         return True
 
-    def symbol_horizontal_bar(self, symbol: GraphSymbol) -> bool:
-        if not symbol.next_right:
+    def symbol_horizontal_bar(self, symbol: int) -> bool:
+        if not symbol & GraphSymbol.NEXT_RIGHT:
             return False
-        if symbol.shift_left:
+        if symbol & GraphSymbol.SHIFT_LEFT:
             return True
-        if symbol.continued_down:
+        if symbol & GraphSymbol.CONTINUED_DOWN:
             return False
-        if not symbol.parent_right and not symbol.continued_right:
+        if not symbol & GraphSymbol.PARENT_RIGHT and not symbol & GraphSymbol.CONTINUED_RIGHT:
             return False
-        if symbol.continued_up and not symbol.continued_up_left:
+        if symbol & GraphSymbol.CONTINUED_UP and not symbol & GraphSymbol.CONTINUED_UP_LEFT:
             return False
-        if not symbol.below_commit:
+        if not symbol & GraphSymbol.BELOW_COMMIT:
             return True
         return False
 
-    def symbol_multi_branch(self, symbol: GraphSymbol) -> bool:
-        if symbol.continued_down:
+    def symbol_multi_branch(self, symbol: int) -> bool:
+        if symbol & GraphSymbol.CONTINUED_DOWN:
             return False
-        if not symbol.continued_right:
+        if not symbol & GraphSymbol.CONTINUED_RIGHT:
             return False
-        if symbol.below_shift:
+        if symbol & GraphSymbol.BELOW_SHIFT:
             return False
-        if symbol.continued_up or symbol.new_column or symbol.below_commit:
-            if symbol.matches_commit:
+        if symbol & GraphSymbol.CONTINUED_UP or symbol & GraphSymbol.NEW_COLUMN or symbol & GraphSymbol.BELOW_COMMIT:
+            if symbol & GraphSymbol.MATCHES_COMMIT:
                 return True
-            if symbol.shift_left:
+            if symbol & GraphSymbol.SHIFT_LEFT:
                 return True
         return False
 
 
+class TigGraphV2NumPy(TigGraphV2):
+    """TigGraphV2 with NumPy-vectorized symbol generation for wide rows.
+
+    The rows stay array('i') so the layout itself is shared with
+    TigGraphV2; generate_symbols() views them as NumPy arrays (no copy) and
+    computes every flag as a boolean vector over all columns. Rows narrower
+    than min_width go through the pure-Python code, which is faster there;
+    NumPy is only imported once a row is wide enough to need it.
+    """
+
+    MIN_WIDTH = 160
+
+    def __init__(self, min_width: int = MIN_WIDTH):
+        super().__init__()
+        self.min_width = min_width
+        self._numpy = None
+
+    @property
+    def np(self):
+        if self._numpy is None:
+            import numpy
+            self._numpy = numpy
+        return self._numpy
+
+    def same_before_after(self, ids):
+        """Nearest other position holding the same ID, on each side (-1/size if none)"""
+        np = self.np
+        size = len(ids)
+        order = np.argsort(ids, kind='stable')
+        sorted_ids = ids[order]
+        same = sorted_ids[1:] == sorted_ids[:-1]
+        left, right = order[:-1][same], order[1:][same]
+        before = np.full(size, -1, dtype=np.intp)
+        after = np.full(size, size, dtype=np.intp)
+        before[right] = left
+        after[left] = right
+        return before, after
+
+    def generate_symbols(self, canvas_symbols: List[int]):
+        """Generate symbols for current row, vectorized over all columns"""
+        size = self.row.size
+        if size < self.min_width:
+            super().generate_symbols(canvas_symbols)
+            return
+
+        np = self.np
+        S = GraphSymbol
+        position = self.position
+        commit_id = self.id
+        row_ids = np.frombuffer(self.row.ids, dtype=np.intc)
+        prev_ids = np.frombuffer(self.prev_row.ids, dtype=np.intc)
+        next_ids = np.frombuffer(self.next_row.ids, dtype=np.intc)
+        row_symbols = np.frombuffer(self.row.symbols, dtype=np.intc)
+        prev_symbols = np.frombuffer(self.prev_row.symbols, dtype=np.intc)
+        positions = np.arange(size)
+        left_of_commit = positions < position
+
+        commits = self.commits_in_row(self.parents)
+        parents = [parent for parent in self.parents.ids if parent != NO_COMMIT]
+
+        same_before, same_after = self.same_before_after(row_ids)
+        prev_before, _ = self.same_before_after(prev_ids)
+        _, next_after = self.same_before_after(next_ids)
+
+        continued_up = (prev_ids == row_ids) & ((prev_symbols & S.SHIFT_LEFT) == 0)
+        shift_left = (row_ids != NO_COMMIT) & (same_before >= 0) & ~continued_up[np.maximum(same_before, 0)]
+        parent_down = np.isin(next_ids, parents)
+        entering = np.flatnonzero(parent_down & (next_ids != row_ids))
+        parent_right_last = entering[-1] if len(entering) else -1
+        matches_commit = row_ids == commit_id
+        commit_at = np.flatnonzero(matches_commit)
+        commit_first = commit_at[0] if len(commit_at) else size
+        commit_last = commit_at[-1] if len(commit_at) else -1
+
+        # new_column: is the column's ID still in prev_row at or right of it?
+        prev_order = np.argsort(prev_ids, kind='stable')
+        prev_sorted = prev_ids[prev_order]
+        last = np.searchsorted(prev_sorted, row_ids, side='right') - 1
+        found = (last >= 0) & (prev_sorted[np.maximum(last, 0)] == row_ids)
+        in_prev_right = found & (prev_order[np.maximum(last, 0)] >= positions)
+
+        flags = [
+            (S.INITIAL, commits < 1),
+            (S.MERGE, commits > 1),
+            (S.CONTINUED_DOWN, (row_ids == next_ids) & ((row_symbols & S.SHIFT_LEFT) == 0)),
+            (S.CONTINUED_UP, continued_up),
+            (S.CONTINUED_RIGHT, same_after < np.where(left_of_commit, position, size)),
+            (S.CONTINUED_LEFT, (row_ids != NO_COMMIT) & (same_before >= np.where(left_of_commit, 0, position))),
+            (S.CONTINUED_UP_LEFT, (prev_ids != NO_COMMIT) & (prev_before >= 0)),
+            (S.PARENT_DOWN, parent_down),
+            (S.PARENT_RIGHT, (positions > position) & (positions < parent_right_last)),
+            (S.FLANKED, np.where(left_of_commit, commit_first < positions, commit_last > positions)),
+            (S.NEXT_RIGHT, next_after < size),
+            (S.MATCHES_COMMIT, matches_commit),
+            (S.SHIFT_LEFT, shift_left),
+            (S.CONTINUE_SHIFT, np.append(shift_left[1:], False)),
+            (S.BELOW_SHIFT, (prev_symbols & S.SHIFT_LEFT) != 0),
+            (S.NEW_COLUMN, (prev_ids == NO_COMMIT) | ~in_prev_right),
+            (S.EMPTY, row_ids == NO_COMMIT),
+        ]
+        symbols = np.zeros(size, dtype=np.int64)
+        for bit, flag in flags:
+            symbols |= np.where(flag, bit, 0)
+
+        if position < size:
+            symbols[position] |= S.COMMIT
+            if self.next_row.symbols[position] & S.BOUNDARY:
+                symbols[position] |= S.BOUNDARY
+        prev_position = self.prev_position
+        if prev_position < size and row_ids[prev_position] == prev_ids[prev_position]:
+            symbols[prev_position] |= S.BELOW_COMMIT
+
+        # Colors are handed out in column order, so they stay sequential
+        color_ids = np.where(row_ids != NO_COMMIT, row_ids, next_ids).tolist()
+        symbols = symbols.tolist()
+        colors_map = self.colors_map
+        for pos in range(size):
+            color = colors_map.get(color_ids[pos])
+            if color is None:
+                color = self.get_color(color_ids[pos])
+            canvas_symbols.append(symbols[pos] | color << S.COLOR_SHIFT)
+
+        self.remove_color(self.id)
+
+    def symbols_to_box(self, canvas_symbols: List[int]) -> str:
+        """Convert a row of symbols to box-drawing characters.
+
+        Wide rows resolve each distinct flag combination once and expand
+        the glyphs with a vectorized table lookup.
+        """
+        if len(canvas_symbols) < self.min_width:
+            return super().symbols_to_box(canvas_symbols)
+
+        np = self.np
+        flags = np.array(canvas_symbols, dtype=np.int64) & GraphSymbol.FLAGS_MASK
+        unique, inverse = np.unique(flags, return_inverse=True)
+        glyphs = np.array([self.symbol_to_box(symbol) for symbol in unique.tolist()], dtype=object)
+        return ''.join(glyphs[inverse].tolist())
+
+
+def create_graph(engine: str = 'auto') -> TigGraphV2:
+    """Create the layout engine.
+
+    'python' is the pure-Python TigGraphV2. 'numpy' vectorizes every row
+    and requires NumPy. 'auto' vectorizes wide rows when NumPy can be
+    imported and otherwise falls back to pure Python.
+    """
+    if engine == 'numpy':
+        import numpy  # noqa: F401 - fail early when it is missing
+        return TigGraphV2NumPy(min_width=0)
+
+    if engine == 'auto':
+        from importlib.util import find_spec
+        if find_spec('numpy') is not None:
+            return TigGraphV2NumPy()
+
+    return TigGraphV2()
+
+
+def format_day(days: int) -> str:
+    """Format a count of days since 1970-01-01 as 'YYYY-MM-DD'.
+
+    Integer-only conversion to the proleptic Gregorian calendar (Howard
+    Hinnant's civil_from_days).
+    """
+    days += 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524
+                   - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    month_index = (5 * day_of_year + 2) // 153  # March-based
+    day = day_of_year - (153 * month_index + 2) // 5 + 1
+    month = month_index + 3 if month_index < 10 else month_index - 9
+    year = year_of_era + era * 400 + (month <= 2)
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+# 'HH:MM' for every minute of a day
+MINUTES_OF_DAY = tuple(f"{hour:02d}:{minute:02d}" for hour in range(24) for minute in range(60))
+
+
 class TigStyleRendererV2:
     """Main renderer using TigGraphV2 algorithm"""
 
-    def __init__(self, repo_path: str):
-        self.repo_path = repo_path
-        self.graph = TigGraphV2()
+    # Fields of one log record, each followed by a NUL byte (with -z, tformat
+    # also ends every record with one). NUL cannot occur in any of them, so
+    # subjects may contain anything. %m is '-' for boundary commits.
+    LOG_FORMAT = '--pretty=tformat:%H%x00%P%x00%an%x00%cd%x00%s%x00%m'
+    LOG_FIELDS = 6
+    CHUNK_SIZE = 1 << 14  # Bytes read from git at once
 
-    def run_git(self, args: List[str]) -> str:
-        """Execute git command"""
+    def __init__(self, repo_path: str, engine: str = 'auto'):
+        self.repo_path = repo_path
+        self.engine = engine
+        self.graph = create_graph(engine)
+        self.commit_ids = {}  # SHA1 -> interned ID, for commits not laid out yet
+        self.next_commit_id = 0
+        self.revision_args = ['--all']  # Revisions and limits passed to git log
+        self.checkpoint_interval = 10000  # Commits between layout checkpoints, 0 to disable
+        self.pipelined = False  # Read git and parse commits in background threads
+        self.local_dates = False  # Show dates in the committer's time zone instead of UTC
+        self.day_strings = {}  # Days since the epoch -> 'YYYY-MM-DD'
+        self.refs = {}  # SHA1 -> formatted branch and tag names (see load_refs)
+        self.source = 'git'  # 'native' reads the commit-graph instead of running git log
+        self.output_format = 'text'  # 'json' and 'binary' yield one record per commit
+        self.abbreviations = {}  # SHA1 -> short hash length, where it isn't SHORT_HASH_LENGTH
+        self.unique_hashes = False  # Short hashes unique in the repository, not only the output
+        self.compress_linear = None  # Longest run of linear commits shown in full (see LinearRuns)
+
+    def reset(self, repo_path: str):
+        """Start over on another repository, keeping the settings.
+
+        Caches that do not depend on the repository (formatted days) are
+        kept, so one renderer can go through many repositories.
+        """
+        max_columns = self.graph.max_columns
+        self.repo_path = repo_path
+        self.graph = create_graph(self.engine)
+        self.graph.max_columns = max_columns
+        self.commit_ids = {}
+        self.next_commit_id = 0
+        self.refs = {}
+        self.abbreviations = {}
+
+    def intern_id(self, commit_hash: str) -> int:
+        """Map a SHA1 to the small integer ID used by the graph"""
+        commit_id = self.commit_ids.get(commit_hash)
+        if commit_id is None:
+            commit_id = self.commit_ids[commit_hash] = self.next_commit_id
+            self.next_commit_id += 1
+        return commit_id
+
+    def release_id(self, commit_hash: str):
+        """Forget a commit's ID once it is laid out.
+
+        In topological order no later commit refers to it, and IDs are never
+        reused, so the table only holds the SHA1s of pending parents.
+        """
+        self.commit_ids.pop(commit_hash, None)
+
+    def run_git(self, args: List[str], input: Optional[str] = None) -> str:
+        """Execute git command, optionally feeding it input"""
         cmd = ['git', '-C', self.repo_path] + args
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = subprocess.run(cmd, input=input, capture_output=True, text=True, check=True)
         return result.stdout
 
-    def get_commits(self) -> List[Commit]:
+    def stream_git(self, args: List[str]) -> Iterator[bytes]:
+        """Execute git command, yielding raw stdout chunks as git produces them.
+
+        The child is killed if the consumer stops early (closed generator,
+        BrokenPipe downstream), so partial renders don't wait for git to walk
+        the whole history.
+        """
+        cmd = ['git', '-C', self.repo_path] + args
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        completed = False
+        try:
+            # read1() returns whatever is available, so the first commits
+            # are not held back until a whole chunk has arrived
+            chunk = proc.stdout.read1(self.CHUNK_SIZE)
+            while chunk:
+                yield chunk
+                chunk = proc.stdout.read1(self.CHUNK_SIZE)
+            completed = True
+        finally:
+            if not completed:
+                proc.kill()
+            proc.stdout.close()
+            stderr = proc.stderr.read().decode('utf-8', 'replace')
+            proc.stderr.close()
+            returncode = proc.wait()
+
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+
+    def get_commits(self) -> CommitStore:
         """Get all commits"""
-        output = self.run_git([
-            'log', '--all', '--topo-order',
-            '--pretty=format:%H%n%P%n%an%n%ci%n%s%n%d%n---END---'
+        commits = CommitStore()
+        commits.extend(self.iter_commits())
+        return commits
+
+    def iter_commits(self, skip: int = 0, layout_only: int = 0) -> Iterator[Commit]:
+        """Parse commits one at a time while git log is still running.
+
+        The first `layout_only` commits are only laid out, never printed:
+        the native source leaves their author, date and subject empty.
+        """
+        self.refs = self.load_refs()
+        native = self.open_native_history() if self.source == 'native' else None
+        if native:
+            history, order = native
+            for index, node in enumerate(itertools.islice(order, skip, None)):
+                yield self._parse_commit(history.fields(node, index >= layout_only))
+            return
+
+        chunks = self.stream_git(['log'] + self.revision_args + [
+            '--topo-order', f'--skip={skip}', '--date=raw', '-z', self.LOG_FORMAT, '--'
         ])
+        if self.pipelined:
+            chunks = iter_in_thread(chunks, batch_size=1)
 
-        commits = []
-        lines = output.split('\n')
-        i = 0
+        try:
+            fields = []
+            pending = b''  # Incomplete last field of the previous chunk
+            for chunk in chunks:
+                # Decode up to the last complete field in one go, so a UTF-8
+                # sequence split across chunks is never cut in half
+                data = pending + chunk if pending else chunk
+                end = data.rfind(b'\0')
+                pending = data[end + 1:]
+                if end < 0:
+                    continue
+                fields += data[:end].decode('utf-8', 'replace').split('\0')
 
-        while i < len(lines):
-            if i + 5 >= len(lines):
-                break
+                end = len(fields) - len(fields) % self.LOG_FIELDS
+                for i in range(0, end, self.LOG_FIELDS):
+                    yield self._parse_commit(fields[i:i + self.LOG_FIELDS])
+                del fields[:end]
+        finally:
+            chunks.close()
+
+    def open_native_history(self):
+        """Prepare the native source: (NativeHistory, commits in order).
+
+        Returns None where only git log gives the right history: without a
+        commit-graph, for revisions other than --all, or when grafts,
+        replace refs or a shallow clone rewrite parents.
+        """
+        if self.revision_args != ['--all']:
+            return None
 
-            hash_full = lines[i].strip()
-            if not hash_full:
-                i += 1
+        try:
+            git_dir, common_dir = (os.path.join(self.repo_path, path) for path in
+                                   self.run_git(['rev-parse', '--git-dir', '--git-common-dir']).split())
+            if (os.path.exists(os.path.join(common_dir, 'shallow')) or
+                    os.path.exists(os.path.join(common_dir, 'info', 'grafts'))):
+                return None
+
+            history = NativeHistory(git_dir, common_dir)
+            # Fields: type, name, peeled type and name (annotated tags), refname
+            refs = self.run_git(['for-each-ref', '--format=%(objecttype) %(objectname) '
+                                 '%(*objecttype) %(*objectname) %(refname)'])
+            tips = []
+            for line in refs.splitlines():
+                kind, oid, peeled_kind, peeled_oid, refname = line.split(' ')
+                if refname.startswith('refs/replace/'):
+                    return None
+                if kind == 'commit':
+                    tips.append(bytes.fromhex(oid))
+                elif peeled_kind == 'commit':
+                    tips.append(bytes.fromhex(peeled_oid))
+                elif peeled_kind == 'tag':
+                    # for-each-ref peels a single level of tags
+                    peeled = history.peel(bytes.fromhex(peeled_oid))
+                    if peeled:
+                        tips.append(peeled)
+            tips += history.head_oids()
+            return history, history.topo_order(tips)
+        except (OSError, ValueError, KeyError, IndexError, struct.error, zlib.error,
+                subprocess.CalledProcessError):
+            return None
+
+    def _parse_commit(self, fields: List[str]) -> Commit:
+        """Build a Commit from the fields of one log record"""
+        hash_full, parents_line, author, date_line, message, mark = fields
+        parents = parents_line.split()
+
+        date, tz = self._parse_date(date_line)
+
+        # Most commits have no refs
+        refs = self.refs.get(hash_full, [])
+
+        return Commit(
+            hash=hash_full,
+            short_hash=hash_full[:SHORT_HASH_LENGTH],
+            parents=parents,
+            author=author.strip(),
+            date=date,
+            timezone=tz,
+            message=message.strip(),
+            refs=refs,
+            id=self.intern_id(hash_full),
+            parent_ids=[self.intern_id(parent) for parent in parents],
+            is_boundary=mark == '-'
+        )
+
+    def _parse_date(self, date_line: str):
+        """Convert a committer date to UTC, returning (date, timezone).
+
+        date_line is git's raw "<epoch seconds> <offset>" (e.g.
+        "1759401465 +0200"). Commits cluster in time, so the day part is
+        formatted once per day and the time of day comes from a table.
+        """
+        epoch, _, offset = date_line.partition(' ')
+        try:
+            seconds = int(epoch)
+            if self.local_dates:
+                sign = -60 if offset[0] == '-' else 60
+                seconds += sign * (int(offset[1:3]) * 60 + int(offset[3:5]))
+        except (ValueError, IndexError):
+            return date_line, 'Z'
+
+        days, minute = divmod(seconds // 60, 1440)
+        day = self.day_strings.get(days)
+        if day is None:
+            day = self.day_strings[days] = format_day(days)
+        return f"{day} {MINUTES_OF_DAY[minute]}", offset if self.local_dates else 'Z'
+
+    def load_refs(self) -> dict:
+        """Index the names of all branches and tags by commit SHA1.
+
+        A single for-each-ref replaces per-commit decorations. Names are
+        formatted and ordered like git log's decorations: the branch HEAD
+        points to first, then local branches, remote-tracking branches and
+        tags, each in reverse refname order. Annotated tags are indexed
+        under the commit they point to, and the boundary commits of a
+        shallow clone are marked [grafted].
+        """
+        output = self.run_git(['for-each-ref', '--format=%(objectname)%00%(*objectname)%00'
+                               '%(*objecttype)%00%(HEAD)%00%(refname)'])
+        lines = [line.split('\0') for line in reversed(output.splitlines())]
+
+        # %(*objectname) peels one level only: tags of tags are peeled down
+        # to their commit by one cat-file for all of them
+        nested = list(dict.fromkeys(fields[1] for fields in lines if fields[2] == 'tag'))
+        peeled = {}
+        if nested:
+            listing = self.run_git(['cat-file', '--batch-check=%(objectname)'],
+                                   ''.join(f'{tag_hash}^{{}}\n' for tag_hash in nested))
+            peeled = dict(zip(nested, listing.split()))
+
+        names = {}  # SHA1 -> (local branches, remote branches, tags)
+        for object_hash, peeled_hash, peeled_type, head, refname in lines:
+            if peeled_type == 'tag':
+                peeled_hash = peeled.get(peeled_hash, peeled_hash)
+            if refname.startswith('refs/heads/'):
+                kind, name = 0, f'[{refname[11:]}]'
+            elif refname.startswith('refs/remotes/'):
+                kind, name = 1, f'{{{refname[13:]}}}'
+            elif refname.startswith('refs/tags/'):
+                kind, name = 2, f'<{refname[10:]}>'
+            elif refname == 'refs/stash':
+                kind, name = 0, f'[{refname}]'
+            else:
+                # git log does not decorate other namespaces (notes, pull
+                # requests, ...) either
                 continue
 
-            parents_line = lines[i + 1].strip()
-            parents = parents_line.split() if parents_line else []
-            author = lines[i + 2].strip()
-            date_line = lines[i + 3].strip()
-            message = lines[i + 4].strip()
-            refs_line = lines[i + 5].strip()
+            groups = names.setdefault(peeled_hash or object_hash, ([], [], []))
+            if head == '*':
+                groups[kind].insert(0, name)
+            else:
+                groups[kind].append(name)
+
+        # Boundary commits of a shallow clone come first, as "grafted"
+        git_dirs = find_git_dirs(self.repo_path)
+        if git_dirs:
+            shallow_path = os.path.join(git_dirs[1], 'shallow')
+        else:
+            shallow_path = os.path.join(self.repo_path, self.run_git(['rev-parse', '--git-path', 'shallow']).strip())
+        try:
+            with open(shallow_path) as f:
+                for commit_hash in f.read().split():
+                    names.setdefault(commit_hash, ([], [], []))[0].insert(0, '[grafted]')
+        except OSError:
+            pass
+
+        return {commit_hash: local + remote + tags
+                for commit_hash, (local, remote, tags) in names.items()}
+
+    def render(self, author_width: Optional[int] = None,
+               skip: int = 0, max_count: Optional[int] = None) -> str:
+        """Render the complete log (or the window selected by skip/max_count)"""
+        return '\n'.join(self.iter_lines(author_width, skip, max_count))
+
+    def iter_lines(self, author_width: Optional[int] = None,
+                   skip: int = 0, max_count: Optional[int] = None) -> Iterator[str]:
+        """Yield output lines one commit at a time.
+
+        With a fixed author_width nothing is buffered: each line is laid out
+        as soon as git prints its commit. Without it, all commits of the
+        window are read first to size the author column to the longest name
+        (capped at 40).
+
+        The first `skip` commits are laid out but not printed. When
+        checkpoints are enabled, layout resumes from the nearest saved
+        checkpoint instead of replaying the history from the first commit.
+
+        When `pipelined` is set, git output is read and parsed by background
+        threads, so only layout and formatting happen in the calling thread.
+
+        With output_format 'binary', records are bytes instead of lines
+        (see pack_record and write_records).
+        """
+        start = 0
+        store = self.open_checkpoints() if skip else None
+        if store:
+            start, state = store.nearest(skip)
+            if state:
+                self.load_state(state)
+
+        commits = self.iter_commits(start, skip - start)
+        if self.pipelined:
+            # Parse ahead in another thread while this one lays out commits
+            commits = iter_in_thread(commits)
+        index = start
 
-            # Parse date and convert to UTC
-            # date_line format: "2025-10-02 12:37:45 +0200"
-            try:
-                # Parse the date with timezone
-                dt = datetime.fromisoformat(date_line.replace(' ', 'T', 1))
-                # Convert to UTC
-                dt_utc = dt.astimezone(timezone.utc)
-                # Format as "YYYY-MM-DD HH:MM"
-                date = dt_utc.strftime('%Y-%m-%d %H:%M')
-                tz = 'Z'
-            except (ValueError, AttributeError):
-                # Fallback if parsing fails
-                date_parts = date_line.split()
-                if len(date_parts) >= 2:
-                    date_str = date_parts[0]
-                    time_parts = date_parts[1].split(':')
-                    time_str = f"{time_parts[0]}:{time_parts[1]}" if len(time_parts) >= 2 else date_parts[1]
-                    date = f"{date_str} {time_str}"
-                    tz = 'Z'
+        try:
+            # Replay the skipped commits to bring the layout up to date
+            for commit in itertools.islice(commits, skip - start):
+                self.layout_commit(commit)
+                index += 1
+                if store:
+                    self.checkpoint(store, index)
+
+            window = commits if max_count is None else itertools.islice(commits, max_count)
+            if author_width is None and self.output_format == 'text':
+                buffered = CommitStore()
+                buffered.extend(window)
+                author_width = self.author_column_width(buffered)
+                self.find_abbreviations(buffered.hashes, buffered.hash_len, skip == 0 and max_count is None, store)
+                window = buffered.drain()
+            elif self.output_format == 'text':
+                self.find_abbreviations(None, 0, skip == 0 and max_count is None, store)
+
+            runs = None if self.compress_linear is None else LinearRuns(self, self.compress_linear, author_width)
+            for commit in window:
+                canvas_symbols = self.layout_commit(commit)
+                index += 1
+                if store:
+                    self.checkpoint(store, index)
+                if runs:
+                    yield from runs.add(commit, canvas_symbols, self.graph.prev_position, bool(self.graph.folded))
                 else:
-                    date = date_line
-                    tz = 'Z'
-
-            # Parse refs
-            refs = self._parse_refs(refs_line)
-
-            commit = Commit(
-                hash=hash_full,
-                short_hash=hash_full[:7],
-                parents=parents,
-                author=author,
-                date=date,
-                timezone=tz,
-                message=message,
-                refs=refs
-            )
+                    yield self.format_commit(commit, canvas_symbols, author_width)
+            if runs:
+                yield from runs.flush()
+        finally:
+            commits.close()
+            if store:
+                store.save()
+
+    def layout_commit(self, commit: Commit) -> List[int]:
+        """Add one commit to the graph and return the symbols of its row"""
+        self.graph.add_commit(commit.id, commit.parent_ids, commit.is_boundary)
+
+        # Render graph for this commit
+        canvas_symbols = []
+        self.graph.render_parents(canvas_symbols)
+        self.release_id(commit.hash)
+        return canvas_symbols
+
+    @staticmethod
+    def author_column_width(commits: Iterable[Commit]) -> int:
+        """Width of the author column: the longest name, capped at 40"""
+        if isinstance(commits, CommitStore):
+            # Each name once, without building the commits
+            names = commits.authors
+        else:
+            names = (c.author for c in commits)
+        return min(max(map(len, names), default=20), 40)
+
+    def format_commit(self, commit: Commit, canvas_symbols: List[int], author_width: int):
+        """Format the output line (or record) of the commit just laid out"""
+        return self.format_row(commit, canvas_symbols, self.graph.prev_position, bool(self.graph.folded),
+                               author_width)
+
+    def format_row(self, commit: Commit, canvas_symbols: List[int], lane: int, folded: bool, author_width: int):
+        """Format the output line (or record) of a commit from its row's symbols, lane and folding"""
+        if self.output_format == 'json':
+            return self.format_record(commit, canvas_symbols, lane, folded)
+        if self.output_format == 'binary':
+            return self.pack_record(commit, canvas_symbols, lane, folded)
+        return self.format_line(commit, self.format_graph(canvas_symbols, folded), author_width)
+
+    def format_graph(self, canvas_symbols: List[int], folded: bool = False) -> str:
+        """Draw the graph columns of a row"""
+        # Convert symbols to string (use symbol_to_box for standard box-drawing chars)
+        graph_str = self.graph.symbols_to_box(canvas_symbols).rstrip()
+        if folded and len(canvas_symbols) <= self.graph.max_columns:
+            # One marker column, right of the last one kept, for all the others
+            graph_str = graph_str.ljust(2 * self.graph.max_columns) + self.graph.OVERFLOW_GLYPH
+        return graph_str
+
+    def abbreviate(self, commit: Commit) -> str:
+        """Short hash of a commit, longer where SHORT_HASH_LENGTH digits are ambiguous"""
+        if commit.hash in self.abbreviations:
+            return commit.hash[:self.abbreviations[commit.hash]]
+        return commit.short_hash
+
+    def format_line(self, commit: Commit, graph_str: str, author_width: int) -> str:
+        """Format the output line of a commit from its drawn graph columns"""
+        # Format output line (timezone omitted for UTC dates)
+        short_hash = self.abbreviate(commit)
+        date = commit.date if commit.timezone == 'Z' else f"{commit.date} {commit.timezone}"
+        author = commit.author[:author_width].ljust(author_width)
+        refs_str = ' ' + ' '.join(commit.refs) if commit.refs else ''
+        return f"{short_hash} {date} {author} {graph_str}{refs_str} {commit.message}"
+
+    def format_record(self, commit: Commit, canvas_symbols: List[int], lane: int, folded: bool) -> str:
+        """Format a commit and its row as one line of JSON.
+
+        Besides the drawn graph, each column is given as its glyph, color
+        and GraphSymbol flags, so clients can draw the row themselves.
+        """
+        import json
+
+        flags_mask = GraphSymbol.FLAGS_MASK
+        return json.dumps({
+            'hash': commit.hash,
+            'parents': commit.parents,
+            'date': commit.date,
+            'timezone': commit.timezone,
+            'author': commit.author,
+            'refs': commit.refs,
+            'message': commit.message,
+            'boundary': commit.is_boundary,
+            'graph': self.format_graph(canvas_symbols, folded),
+            'lane': lane,
+            'folded': folded,
+            'glyphs': [self.graph.symbol_to_box(symbol) for symbol in canvas_symbols],
+            'colors': [GraphSymbol.color(symbol) for symbol in canvas_symbols],
+            'flags': [symbol & flags_mask for symbol in canvas_symbols],
+        }, ensure_ascii=False)
+
+    def format_summary(self, count: int, first: Commit, last: Commit, canvas_symbols: List[int], lane: int,
+                       folded: bool, author_width: int) -> str:
+        """Format the row standing for `count` linear commits, first to last (see LinearRuns).
+
+        The row is drawn as the commits' rows were, but with their lane
+        passing straight through instead of a commit marker. In JSON, the
+        record has the number of commits and the first and last hashes
+        instead of a commit's fields.
+        """
+        symbols = list(canvas_symbols)
+        symbols[lane] = symbols[lane] & ~GraphSymbol.FLAGS_MASK | GraphSymbol.CONTINUED_UP | GraphSymbol.CONTINUED_DOWN
+        message = f"… {count:,} commit{'' if count == 1 else 's'} …"
+        graph_str = self.format_graph(symbols, folded)
+        if self.output_format == 'json':
+            import json
+
+            flags_mask = GraphSymbol.FLAGS_MASK
+            return json.dumps({
+                'commits': count,
+                'first': first.hash,
+                'last': last.hash,
+                'message': message,
+                'graph': graph_str,
+                'lane': lane,
+                'folded': folded,
+                'glyphs': [self.graph.symbol_to_box(symbol) for symbol in symbols],
+                'colors': [GraphSymbol.color(symbol) for symbol in symbols],
+                'flags': [symbol & flags_mask for symbol in symbols],
+            }, ensure_ascii=False)
+        # Blank columns as wide as in the first commit's row (see format_line),
+        # so that the graphs line up
+        hash_width = len(self.abbreviate(first))
+        date_width = len(first.date) + (0 if first.timezone == 'Z' else len(first.timezone) + 1)
+        return f"{'':{hash_width}} {'':{date_width}} {'':{author_width}} {graph_str} {message}"
+
+    # Binary records: a little-endian header, then the packed GraphSymbol
+    # of each column, raw hashes and length-prefixed UTF-8 strings. Records
+    # are padded to 4 bytes so the symbols can be viewed as uint32 in place.
+    BINARY_HEADER = b'GGGB\x02\x00\x00\x00'  # Magic and version, once per stream
+    RECORD_HEADER = struct.Struct('<IBBHHHHxx')  # Size, flags, hash length, parents, refs, lane, columns
+    RECORD_BOUNDARY = 1
+    RECORD_FOLDED = 2
+
+    def pack_record(self, commit: Commit, canvas_symbols: List[int], lane: int, folded: bool) -> bytes:
+        """Encode a commit and its row as a binary record.
+
+        Layout: u32 size of the rest of the record, u8 flags (RECORD_*),
+        u8 hash length, u16 parent count, u16 ref count, u16 lane, u16
+        column count, 2 zero bytes; u32 symbols[columns]; the commit hash
+        and parent hashes as raw bytes; date, timezone, author, message and
+        each ref as a u32 length and UTF-8 bytes; zero padding to a multiple
+        of 4.
+        """
+        hashes = bytes.fromhex(commit.hash + ''.join(commit.parents))
+        strings = [commit.date, commit.timezone, commit.author, commit.message] + commit.refs
+        parts = [b'', array('I', canvas_symbols).tobytes(), hashes]
+        for string in strings:
+            data = string.encode('utf-8', 'surrogateescape')
+            parts.append(struct.pack('<I', len(data)))
+            parts.append(data)
+        body_size = self.RECORD_HEADER.size - 4 + sum(len(part) for part in parts)
+        padding = -body_size % 4
+        flags = (self.RECORD_BOUNDARY if commit.is_boundary else 0) | (self.RECORD_FOLDED if folded else 0)
+        parts[0] = self.RECORD_HEADER.pack(body_size + padding, flags, len(commit.hash) // 2,
+                                           len(commit.parents), len(commit.refs), lane, len(canvas_symbols))
+        parts.append(bytes(padding))
+        return b''.join(parts)
+
+    def render_to_file(self, output_path: str, author_width: Optional[int] = None,
+                       skip: int = 0, max_count: Optional[int] = None):
+        """Render to file"""
+        if self.output_format == 'binary':
+            with open(output_path, 'wb') as f:
+                write_records(f, self.iter_lines(author_width, skip, max_count))
+            return
+        with open(output_path, 'w', encoding='utf-8') as f:
+            write_lines(f, self.iter_lines(author_width, skip, max_count), self.pipelined)
+
+    def find_abbreviations(self, hashes: Optional[bytes], hash_len: int, whole: bool,
+                           store: Optional['CheckpointStore'] = None):
+        """Find the short hashes that need more than SHORT_HASH_LENGTH digits.
+
+        A short hash is made unique among the commits shown, packed in
+        `hashes`, in one pass over them (see long_abbreviations). Streamed
+        lines (`hashes` is None) are written before the commits below them
+        are known, so theirs keep SHORT_HASH_LENGTH digits. With
+        unique_hashes, they are unique among all commits of the repository,
+        as git needs them anywhere: unless the `whole` history of --all is
+        shown, git has to list every commit first (see load_abbreviations).
+        """
+        if self.unique_hashes and not (hashes is not None and whole and self.revision_args == ['--all']):
+            self.load_abbreviations(store or self.open_checkpoints())
+        elif hashes is not None:
+            self.abbreviations = long_abbreviations(hashes, hash_len)
+        else:
+            self.abbreviations = {}
+
+    def load_abbreviations(self, store: Optional['CheckpointStore'] = None):
+        """Find the short hashes that need more digits among all commits of the repository.
+
+        `git rev-list --all` lists them, which walks the whole history,
+        once per ref state when `store` keeps the result.
+        """
+        if store and store.abbreviations is not None:
+            self.abbreviations = store.abbreviations
+            return
+        # fromhex() skips the newlines between hashes
+        listing = self.run_git(['rev-list', '--all'])
+        count = listing.count('\n')
+        hashes = bytes.fromhex(listing)
+        self.abbreviations = long_abbreviations(hashes, len(hashes) // count if count else 0)
+        if store:
+            store.set_abbreviations(self.abbreviations)
+            store.save()
+
+    # Layout checkpoints
+
+    def date_limited(self) -> bool:
+        """Whether --since or --until is given. Relative dates ("2 weeks ago")
+        select other commits as time passes, so layouts are not reusable.
+        """
+        return any(arg.startswith(('--since=', '--until=')) for arg in self.revision_args)
+
+    def open_checkpoints(self) -> Optional['CheckpointStore']:
+        """Open the checkpoint file for the current ref tips, if enabled"""
+        if not self.checkpoint_interval or self.date_limited():
+            return None
 
-            commits.append(commit)
+        try:
+            git_dir = self.run_git(['rev-parse', '--git-common-dir']).strip()
+            tips = self.run_git(['show-ref', '--head'])
+        except subprocess.CalledProcessError:
+            # No refs at all: nothing worth checkpointing
+            return None
+
+        import hashlib
+
+        key_parts = [tips] + self.revision_args
+        if self.graph.max_columns:
+            key_parts.append(f'--max-columns={self.graph.max_columns}')
+        key = hashlib.sha1('\0'.join(key_parts).encode()).hexdigest()
+        store = CheckpointStore(os.path.join(self.repo_path, git_dir, CheckpointStore.FILE_NAME), key)
+        store.load()
+        return store
+
+    def checkpoint(self, store: 'CheckpointStore', index: int):
+        """Save the layout state after `index` commits if one is due"""
+        if index % self.checkpoint_interval == 0 and index not in store.states:
+            store.add(index, self.save_state())
+
+    def save_state(self) -> dict:
+        """Snapshot the graph state with commit IDs translated back to SHA1s.
+
+        IDs of commits already laid out (which can linger in prev_row) have
+        no SHA1 any more; they are saved as '#<id>' placeholders, which only
+        need to stay distinct from each other.
+        """
+        # list() copies the table in one step, as a pipelined parse thread
+        # may be interning the IDs of upcoming commits meanwhile
+        hashes = {commit_id: commit_hash for commit_hash, commit_id in list(self.commit_ids.items())}
+        hashes[NO_COMMIT] = None
+
+        def token(commit_id):
+            if commit_id in hashes:
+                return hashes[commit_id]
+            return f'#{commit_id}'
+
+        state = self.graph.get_state()
+        state['rows'] = [[token(commit_id) for commit_id in ids] for ids in state['rows']]
+        state['colors_map'] = [[token(commit_id), color] for commit_id, color in state['colors_map'].items()]
+        state['folded'] = [token(commit_id) for commit_id in state['folded']]
+        return state
+
+    def load_state(self, state: dict):
+        """Restore a snapshot taken by save_state()"""
+        placeholders = {}
+
+        def commit_id(token):
+            if token is None:
+                return NO_COMMIT
+            if not token.startswith('#'):
+                return self.intern_id(token)
+            if token not in placeholders:
+                placeholders[token] = self.next_commit_id
+                self.next_commit_id += 1
+            return placeholders[token]
+
+        state = dict(state)
+        state['rows'] = [[commit_id(token) for token in row] for row in state['rows']]
+        state['colors_map'] = {commit_id(token): color for token, color in state['colors_map']}
+        state['folded'] = [commit_id(token) for token in state.get('folded', ())]
+        self.graph.set_state(state)
+
+
+class LinearRuns:
+    """Collapses long runs of linear commits into summary rows (--compress-linear).
+
+    A commit is linear when it has one parent, no refs, is no boundary
+    commit and its row is drawn exactly like the one above: its lane goes
+    straight on and no other lane changes. TigGraphV2 lays such commits out
+    without generating their rows (see TigGraphV2.step_steady). Runs of up
+    to `limit` of them are shown in full; a longer run becomes one row from
+    format_summary. Only the first `limit` rows of a run are held back, so
+    a run costs the same memory however long it gets.
+    """
+
+    def __init__(self, renderer: TigStyleRendererV2, limit: int, author_width: int):
+        self.renderer = renderer
+        self.limit = limit
+        self.author_width = author_width
+        self.previous = None  # (symbols, lane, folded) of the last row
+        self.run = []  # (commit, symbols, lane, folded) of the first commits of the run
+        self.count = 0  # Commits in the run
+        self.first = self.last = None  # Ends of the run
+
+    def add(self, commit: Commit, canvas_symbols: List[int], lane: int, folded: bool) -> list:
+        """Take the row of the commit just laid out; return the lines now due"""
+        row = (canvas_symbols, lane, folded)
+        if (row == self.previous and len(commit.parents) == 1 and not commit.refs and
+                not commit.is_boundary):
+            self.count += 1
+            if self.count == 1:
+                self.first = commit
+            self.last = commit
+            if self.count <= self.limit:
+                self.run.append((commit,) + row)
+            elif self.run:
+                self.run = []
+            return []
 
-            while i < len(lines) and lines[i].strip() != '---END---':
-                i += 1
-            i += 1
+        lines = self.flush()
+        self.previous = row
+        lines.append(self.renderer.format_row(commit, canvas_symbols, lane, folded, self.author_width))
+        return lines
 
-        return commits
+    def flush(self) -> list:
+        """End the current run, returning its lines"""
+        if self.count > self.limit:
+            lines = [self.renderer.format_summary(self.count, self.first, self.last, *self.previous,
+                                                  self.author_width)]
+        else:
+            lines = [self.renderer.format_row(*row, self.author_width) for row in self.run]
+        self.run = []
+        self.count = 0
+        self.first = self.last = None
+        return lines
 
-    def _parse_refs(self, refs_line: str) -> List[str]:
-        """Parse and format references"""
-        if not refs_line or refs_line == '---END---':
-            return []
 
-        refs_line = refs_line.strip()
-        if refs_line.startswith('(') and refs_line.endswith(')'):
-            refs_line = refs_line[1:-1]
+class CheckpointStore:
+    """Layout checkpoints of one repository, kept in a file in its git dir.
 
-        if not refs_line:
-            return []
+    Maps a commit index to the TigGraphV2 state before that commit is laid
+    out (see TigStyleRendererV2.save_state). The file belongs to the ref
+    tips it was built from; once any ref moves the key no longer matches,
+    the old checkpoints are ignored and replaced on the next save.
+    """
 
-        local_branches = []
-        remote_branches = []
-        tags = []
+    FILE_NAME = 'pyggg-checkpoints'
+    VERSION = 1
 
-        # Common remote names. Actually we will always find 'origin'
-        common_remotes = {'origin', 'upstream'}  # , 'fork', 'github', 'gitlab', 'bitbucket'}
+    def __init__(self, path: str, key: str):
+        self.path = path
+        self.key = key
+        self.states = {}
+        self.abbreviations = None  # See TigStyleRendererV2.load_abbreviations
+        self.dirty = False
 
-        for ref in refs_line.split(','):
-            ref = ref.strip()
-            if not ref:
+    def load(self):
+        """Read checkpoints from disk, ignoring missing or stale files"""
+        import json
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+        except (OSError, ValueError, zlib.error):
+            return
+
+        if data.get('version') == self.VERSION and data.get('key') == self.key:
+            self.states = {int(index): state for index, state in data['states'].items()}
+            self.abbreviations = data.get('abbreviations')
+
+    def nearest(self, index: int):
+        """Return (checkpoint index, state) of the last checkpoint at or before index"""
+        best = max((i for i in self.states if i <= index), default=0)
+        return best, self.states.get(best)
+
+    def add(self, index: int, state: dict):
+        """Add a checkpoint"""
+        self.states[index] = state
+        self.dirty = True
+
+    def set_abbreviations(self, abbreviations: dict):
+        """Keep the long short hashes of these ref tips too"""
+        self.abbreviations = abbreviations
+        self.dirty = True
+
+    def save(self):
+        """Write checkpoints back if any were added"""
+        if not self.dirty:
+            return
+
+        import json
+
+        data = {'version': self.VERSION, 'key': self.key, 'states': self.states}
+        if self.abbreviations is not None:
+            data['abbreviations'] = self.abbreviations
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8')))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Checkpoints are only a cache; a read-only repo just doesn't get them
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        self.dirty = False
+
+
+# Clears the low hex digit of a byte (see long_abbreviations)
+HIGH_NIBBLES = bytes(byte & 0xF0 for byte in range(256))
+
+
+def long_abbreviations(hashes: bytes, hash_len: int, minimum: int = SHORT_HASH_LENGTH) -> dict:
+    """Short hash lengths of the commits that `minimum` hex digits don't tell apart.
+
+    `hashes` are packed, `hash_len` bytes each, and `minimum` is at most 8.
+    One pass over the first `minimum` digits of every hash, kept as 32-bit
+    keys, finds the prefixes shared by several commits. Only those commits
+    are sorted, and each gets one digit more than it has in common with its
+    closest neighbour, as git abbreviates. All other commits are unique at
+    `minimum` digits and left out, so the result is usually empty.
+    """
+    count = len(hashes) // hash_len if hash_len else 0
+    if not count:
+        return {}
+    # Gather the first four bytes of each hash and clear the digits past
+    # `minimum`; byte order doesn't matter as keys are only compared
+    prefixes = bytearray(4 * count)
+    for i in range(4):
+        digits = minimum - 2 * i
+        if digits >= 2:
+            prefixes[i::4] = hashes[i::hash_len]
+        elif digits == 1:
+            prefixes[i::4] = hashes[i::hash_len].translate(HIGH_NIBBLES)
+    keys = array('I', bytes(prefixes))
+
+    seen = set()
+    add = seen.add
+    shared = {key for key in keys if key in seen or add(key)}
+    if not shared:
+        return {}
+
+    names = sorted(hashes[i * hash_len:(i + 1) * hash_len].hex()
+                   for i in itertools.compress(range(count), map(shared.__contains__, keys)))
+    lengths = dict.fromkeys(names, minimum)
+    for name, other in zip(names, names[1:]):
+        common = len(os.path.commonprefix((name, other)))
+        if common >= minimum:
+            lengths[name] = max(lengths[name], common + 1)
+            lengths[other] = max(lengths[other], common + 1)
+    return lengths
+
+
+def find_oid(table, fanout, start: int, hash_len: int, oid: bytes) -> int:
+    """Index of oid in a sorted table of object names, or -1.
+
+    fanout[b] is the number of names whose first byte is at most b, as in
+    pack indexes and commit-graph files.
+    """
+    lo = fanout[oid[0] - 1] if oid[0] else 0
+    hi = fanout[oid[0]]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset = start + mid * hash_len
+        name = table[offset:offset + hash_len]
+        if name < oid:
+            lo = mid + 1
+        elif name > oid:
+            hi = mid
+        else:
+            return mid
+    return -1
+
+
+def map_file(path: str) -> mmap.mmap:
+    """Memory-map a file read-only"""
+    import mmap
+
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuild an object from its delta base and a git delta"""
+    def size_at(pos):
+        size = shift = 0
+        while True:
+            byte = delta[pos]
+            pos += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return size, pos
+
+    _, pos = size_at(0)  # Size of the base
+    size, pos = size_at(pos)
+    result = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            # Copy from the base: offset and size bytes present per the op bits
+            offset = length = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    length |= delta[pos] << (8 * i)
+                    pos += 1
+            result += base[offset:offset + (length or 0x10000)]
+        elif op:
+            # Insert the next op bytes
+            result += delta[pos:pos + op]
+            pos += op
+        else:
+            raise ValueError("invalid delta")
+
+    if len(result) != size:
+        raise ValueError("delta size mismatch")
+    return bytes(result)
+
+
+class PackIndex:
+    """Offsets of the objects of one packfile, from its version 2 .idx file"""
+
+    def __init__(self, idx_path: str, hash_len: int):
+        self.idx = map_file(idx_path)
+        if self.idx[:8] != b'\377tOc\0\0\0\2':
+            raise ValueError(f"unsupported pack index: {idx_path}")
+        self.hash_len = hash_len
+        self.fanout = struct.unpack_from('>256I', self.idx, 8)
+        count = self.fanout[255]
+        self.names = 8 + 256 * 4
+        self.offsets = self.names + count * (hash_len + 4)  # Past the CRC32s
+        self.large_offsets = self.offsets + count * 4
+        self.pack_path = idx_path[:-4] + '.pack'
+        self.pack = None  # Mapped on first use
+
+    def find(self, oid: bytes) -> int:
+        """Offset of an object in the packfile, or -1"""
+        index = find_oid(self.idx, self.fanout, self.names, self.hash_len, oid)
+        if index < 0:
+            return -1
+        offset = struct.unpack_from('>I', self.idx, self.offsets + index * 4)[0]
+        if offset & 0x80000000:
+            offset = struct.unpack_from('>Q', self.idx, self.large_offsets + (offset & 0x7fffffff) * 8)[0]
+        return offset
+
+
+class GitObjects:
+    """Read-only access to the object database: loose objects and packs.
+
+    Only what commit metadata needs is supported: whole objects by name,
+    with offset and ref deltas resolved. Alternates are followed.
+    """
+
+    TYPES = {1: b'commit', 2: b'tree', 3: b'blob', 4: b'tag'}
+    OFS_DELTA = 6
+    REF_DELTA = 7
+
+    def __init__(self, objects_dir: str, hash_len: int = 20):
+        self.hash_len = hash_len
+        self.dirs = []
+        self.add_objects_dir(objects_dir)
+        self.packs = []
+        for directory in self.dirs:
+            pack_dir = os.path.join(directory, 'pack')
+            try:
+                names = sorted(os.listdir(pack_dir))
+            except OSError:
                 continue
+            self.packs += [PackIndex(os.path.join(pack_dir, name), hash_len)
+                           for name in names if name.endswith('.idx')]
+
+    def add_objects_dir(self, objects_dir: str):
+        """Add an objects directory and, recursively, its alternates"""
+        objects_dir = os.path.realpath(objects_dir)
+        if objects_dir in self.dirs:
+            return
+        self.dirs.append(objects_dir)
+        try:
+            with open(os.path.join(objects_dir, 'info', 'alternates')) as f:
+                alternates = f.read().splitlines()
+        except OSError:
+            return
+        for alternate in alternates:
+            if alternate and not alternate.startswith('#'):
+                self.add_objects_dir(os.path.join(objects_dir, alternate))
+
+    def read(self, oid: bytes):
+        """Return (type, content) of an object, e.g. (b'commit', b'tree ...')"""
+        for pack in self.packs:
+            offset = pack.find(oid)
+            if offset >= 0:
+                return self.read_packed(pack, offset)
+
+        name = oid.hex()
+        for directory in self.dirs:
+            try:
+                with open(os.path.join(directory, name[:2], name[2:]), 'rb') as f:
+                    raw = zlib.decompress(f.read())
+            except OSError:
+                continue
+            header, _, content = raw.partition(b'\0')
+            return header.split(b' ')[0], content
+
+        raise KeyError(name)
+
+    def read_packed(self, pack: PackIndex, offset: int):
+        """Read a packed object, following its chain of deltas"""
+        if pack.pack is None:
+            pack.pack = map_file(pack.pack_path)
+        data = pack.pack
+
+        deltas = []
+        while True:
+            entry = offset
+            byte = data[offset]
+            kind = (byte >> 4) & 7
+            size = byte & 15
+            shift = 4
+            offset += 1
+            while byte & 0x80:
+                byte = data[offset]
+                size |= (byte & 0x7f) << shift
+                shift += 7
+                offset += 1
+
+            if kind == self.OFS_DELTA:
+                # The base is an earlier entry of the same pack
+                byte = data[offset]
+                distance = byte & 0x7f
+                offset += 1
+                while byte & 0x80:
+                    byte = data[offset]
+                    distance = ((distance + 1) << 7) | (byte & 0x7f)
+                    offset += 1
+                deltas.append(self.inflate(data, offset, size))
+                offset = entry - distance
+            elif kind == self.REF_DELTA:
+                # The base is named, and may live anywhere
+                base = bytes(data[offset:offset + self.hash_len])
+                deltas.append(self.inflate(data, offset + self.hash_len, size))
+                kind, content = self.read(base)
+                break
+            else:
+                kind = self.TYPES[kind]
+                content = self.inflate(data, offset, size)
+                break
 
-            if ref.startswith('tag: '):
-                tags.append(f'<{ref[5:].strip()}>')
-            elif 'HEAD ->' in ref:
-                # Extract the branch name from "HEAD -> branch"
-                branch = ref.split('->')[1].strip()
-                local_branches.append(f'[{branch}]')
-            elif ref == 'HEAD':
+        for delta in reversed(deltas):
+            content = apply_delta(content, delta)
+        return kind, content
+
+    @staticmethod
+    def inflate(data, offset: int, size: int) -> bytes:
+        """Decompress the zlib stream at offset, which inflates to size bytes"""
+        window = size + 64
+        try:
+            # Usually the whole stream fits in the window
+            result = zlib.decompress(data[offset:offset + window], zlib.MAX_WBITS, size)
+        except zlib.error:
+            result = b''
+        if len(result) == size:
+            return result
+
+        inflater = zlib.decompressobj()
+        result = inflater.decompress(data[offset:offset + window])
+        while not inflater.eof and offset + window < len(data):
+            offset += window
+            result += inflater.decompress(data[offset:offset + window])
+        if len(result) != size:
+            raise ValueError("corrupt packed object")
+        return result
+
+
+class CommitGraph:
+    """Parents and commit dates from the commit-graph of a repository.
+
+    Reads either objects/info/commit-graph or the split chain in
+    objects/info/commit-graphs. Positions are numbered across all layers
+    of a chain, base layer first, as in the files themselves.
+    """
+
+    PARENT_NONE = 0x70000000
+    EXTRA_EDGES = 0x80000000  # Second parent field points into the EDGE chunk
+    LAST_EDGE = 0x80000000
+
+    def __init__(self, paths: List[str]):
+        self.layers = []  # (map, first position, count, fanout, OIDL, CDAT, EDGE)
+        self.count = 0
+        self.hash_len = 20
+        self.parent1 = array('I')
+        self.parent2 = array('I')
+        self.times = array('q')
+        self.generations = array('I')  # Topological levels, 0 if not computed
+        for path in paths:
+            self.add_layer(path)
+
+    @classmethod
+    def open(cls, objects_dir: str) -> Optional['CommitGraph']:
+        """Open the commit-graph of an objects directory, if it has one"""
+        info_dir = os.path.join(objects_dir, 'info')
+        single = os.path.join(info_dir, 'commit-graph')
+        if os.path.exists(single):
+            return cls([single])
+
+        chain_dir = os.path.join(info_dir, 'commit-graphs')
+        try:
+            with open(os.path.join(chain_dir, 'commit-graph-chain')) as f:
+                chain = f.read().split()
+        except OSError:
+            return None
+        if not chain:
+            return None
+        return cls([os.path.join(chain_dir, f'graph-{name}.graph') for name in chain])
+
+    def add_layer(self, path: str):
+        data = map_file(path)
+        signature, version, hash_version, chunk_count = struct.unpack_from('>4sBBB', data, 0)
+        if signature != b'CGPH' or version != 1 or hash_version not in (1, 2):
+            raise ValueError(f"unsupported commit-graph: {path}")
+        self.hash_len = 20 if hash_version == 1 else 32
+
+        chunks = {}
+        for i in range(chunk_count):
+            chunk_id, offset = struct.unpack_from('>4sQ', data, 8 + 12 * i)
+            chunks[chunk_id] = offset
+        fanout = struct.unpack_from('>256I', data, chunks[b'OIDF'])
+        count = fanout[255]
+        cdat = chunks[b'CDAT']
+        self.layers.append((data, self.count, count, fanout, chunks[b'OIDL'],
+                            cdat, chunks.get(b'EDGE')))
+        self.count += count
+
+        # Decode the parents and dates of the whole layer at once: the walk
+        # asks for them several times per commit
+        records = memoryview(data)[cdat:cdat + count * (self.hash_len + 16)]
+        for parent1, parent2, high, low in struct.iter_unpack(f'>{self.hash_len}xIIII', records):
+            self.parent1.append(parent1)
+            self.parent2.append(parent2)
+            self.times.append(((high & 3) << 32) | low)
+            self.generations.append(high >> 2)
+        records.release()
+
+    def layer_of(self, position: int):
+        if len(self.layers) == 1:
+            return self.layers[0]
+        for layer in self.layers:
+            if layer[1] <= position < layer[1] + layer[2]:
+                return layer
+        raise IndexError(position)
+
+    def position(self, oid: bytes) -> int:
+        """Position of a commit in the graph, or -1"""
+        for data, first, _, fanout, oidl, _, _ in reversed(self.layers):
+            index = find_oid(data, fanout, oidl, self.hash_len, oid)
+            if index >= 0:
+                return first + index
+        return -1
+
+    def oid(self, position: int) -> bytes:
+        data, first, _, _, oidl, _, _ = self.layer_of(position)
+        offset = oidl + (position - first) * self.hash_len
+        return data[offset:offset + self.hash_len]
+
+    def parents(self, position: int) -> List[int]:
+        parent1 = self.parent1[position]
+        if parent1 == self.PARENT_NONE:
+            return []
+        parent2 = self.parent2[position]
+        if parent2 == self.PARENT_NONE:
+            return [parent1]
+        if not parent2 & self.EXTRA_EDGES:
+            return [parent1, parent2]
+
+        data, _, _, _, _, _, edge = self.layer_of(position)
+        parents = [parent1]
+        offset = edge + (parent2 & ~self.EXTRA_EDGES) * 4
+        while True:
+            parent = struct.unpack_from('>I', data, offset)[0]
+            parents.append(parent & ~self.LAST_EDGE)
+            if parent & self.LAST_EDGE:
+                return parents
+            offset += 4
+
+    def commit_time(self, position: int) -> int:
+        return self.times[position]
+
+    def generation(self, position: int) -> int:
+        return self.generations[position]
+
+
+class NativeHistory:
+    """The commits of `git log --all --topo-order`, without running git log.
+
+    Parents and dates come from the commit-graph. Commits missing from it
+    (written since the graph was last updated) are read from the object
+    database, as is the metadata of every commit that gets printed.
+
+    The order is the one git produces with a commit-graph: tips sorted by
+    commit date, newest first, then a depth-first walk that emits a commit
+    once all its children are emitted, taking the last parent pushed first.
+    """
+
+    GENERATION_INFINITY = 0xffffffff  # Commits outside the graph
+
+    def __init__(self, git_dir: str, common_dir: str):
+        objects_dir = os.path.join(common_dir, 'objects')
+        self.graph = CommitGraph.open(objects_dir)
+        if self.graph is None:
+            raise ValueError("no commit-graph")
+        self.objects = GitObjects(objects_dir, self.graph.hash_len)
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        # Commits outside the graph get the positions after it
+        self.extra_oids = []
+        self.extra_parents = []
+        self.extra_times = []
+        self.extra_positions = {}
+
+    def node(self, oid: bytes) -> int:
+        """Graph position of a commit, reading it if the graph lacks it"""
+        position = self.graph.position(oid)
+        if position >= 0:
+            return position
+        position = self.extra_positions.get(oid)
+        if position is not None:
+            return position
+
+        kind, content = self.objects.read(oid)
+        if kind != b'commit':
+            raise ValueError(f"not a commit: {oid.hex()}")
+        headers = parse_commit_headers(content)
+        position = self.graph.count + len(self.extra_oids)
+        self.extra_positions[oid] = position
+        self.extra_oids.append(oid)
+        self.extra_times.append(int(headers[b'committer'][0].rsplit(b' ', 2)[1]))
+        # Parent names, replaced by positions when first asked for
+        self.extra_parents.append([bytes.fromhex(parent.decode()) for parent in headers.get(b'parent', [])])
+        return position
+
+    def oid(self, node: int) -> bytes:
+        if node < self.graph.count:
+            return self.graph.oid(node)
+        return self.extra_oids[node - self.graph.count]
+
+    def parents(self, node: int) -> List[int]:
+        if node < self.graph.count:
+            return self.graph.parents(node)
+        parents = self.extra_parents[node - self.graph.count]
+        if parents and isinstance(parents[0], bytes):
+            parents = self.extra_parents[node - self.graph.count] = [self.node(oid) for oid in parents]
+        return parents
+
+    def commit_time(self, node: int) -> int:
+        if node < self.graph.count:
+            return self.graph.commit_time(node)
+        return self.extra_times[node - self.graph.count]
+
+    def peel(self, oid: bytes) -> Optional[bytes]:
+        """The commit a chain of tags ends at, or None"""
+        while True:
+            kind, content = self.objects.read(oid)
+            if kind == b'commit':
+                return oid
+            if kind != b'tag' or not content.startswith(b'object '):
+                return None
+            oid = bytes.fromhex(content[7:content.index(b'\n')].decode())
+
+    def head_oids(self) -> List[bytes]:
+        """Detached HEADs of this and the other worktrees"""
+        paths = [os.path.join(self.git_dir, 'HEAD'), os.path.join(self.common_dir, 'HEAD')]
+        worktrees = os.path.join(self.common_dir, 'worktrees')
+        if os.path.isdir(worktrees):
+            paths += [os.path.join(worktrees, name, 'HEAD') for name in sorted(os.listdir(worktrees))]
+
+        oids = []
+        for path in paths:
+            try:
+                with open(path) as f:
+                    head = f.read().strip()
+            except OSError:
                 continue
-            elif '/' in ref:
-                # Check if it's a remote reference by examining the prefix
-                ref_parts = ref.split('/', 1)
-                if ref_parts[0] in common_remotes:
-                    # This is a remote reference (e.g., origin/master)
-                    remote_branches.append(f'{{{ref}}}')
-                else:
-                    # This is a local branch with / in the name (e.g., feature/login)
-                    local_branches.append(f'[{ref}]')
+            if not head.startswith('ref:'):
+                oids.append(bytes.fromhex(head))
+        return oids
+
+    def generation(self, node: int) -> int:
+        """Generation number: greater than that of any of the parents"""
+        if node < self.graph.count and self.graph.generation(node):
+            return self.graph.generation(node)
+        return self.GENERATION_INFINITY
+
+    def topo_order(self, tips: List[bytes]) -> Iterator[int]:
+        """All commits reachable from tips, in git's --topo-order.
+
+        Commits are yielded as soon as their place is known: counting the
+        children of a commit only needs the commits of a higher generation,
+        so only a prefix of the history is read before the first one.
+        """
+        seen = set()
+        nodes = []
+        for oid in tips:
+            if oid not in seen:
+                seen.add(oid)
+                nodes.append(self.node(oid))
+        tips = nodes
+        # Stable sort, so equal dates keep the order refs were listed in
+        tips.sort(key=self.commit_time, reverse=True)
+
+        # indegree: 1 + number of children counted so far, 0 for commits not
+        # reached yet. Children are counted in decreasing generation order.
+        indegree = array('i', bytes(4 * (self.graph.count + len(self.extra_oids))))
+        pending = []  # Heap of (-generation, node) whose parents are not counted yet
+        for node in tips:
+            if not indegree[node]:
+                indegree[node] = 1
+                pending.append((-self.generation(node), node))
+        heapq.heapify(pending)
+
+        def count_children(generation: int):
+            """Count all the children of the commits of this generation"""
+            while pending and -pending[0][0] >= generation:
+                for parent in self.parents(heapq.heappop(pending)[1]):
+                    while parent >= len(indegree):
+                        indegree.append(0)
+                    if not indegree[parent]:
+                        indegree[parent] = 1
+                        heapq.heappush(pending, (-self.generation(parent), parent))
+                    indegree[parent] += 1
+
+        count_children(min((self.generation(node) for node in tips), default=0))
+        stack = [node for node in tips if indegree[node] == 1]
+        stack.reverse()
+
+        def walk() -> Iterator[int]:
+            while stack:
+                node = stack.pop()
+                yield node
+                for parent in self.parents(node):
+                    count_children(self.generation(parent))
+                    indegree[parent] -= 1
+                    if indegree[parent] == 1:
+                        stack.append(parent)
+
+        return walk()
+
+    def fields(self, node: int, details: bool = True) -> List[str]:
+        """The fields of TigStyleRendererV2.LOG_FORMAT for a commit.
+
+        Without details only the hashes are filled in and the commit object
+        is not read at all.
+        """
+        oid = self.oid(node)
+        parents = ' '.join(self.oid(parent).hex() for parent in self.parents(node))
+        if not details:
+            return [oid.hex(), parents, '', '', '', '>']
+
+        _, content = self.objects.read(oid)
+        end = content.find(b'\n\n')
+        if end < 0:
+            end = len(content)
+
+        def header(name: bytes) -> bytes:
+            # The first header is always "tree", so the others follow a newline
+            start = content.find(name, 0, end)
+            if start < 0:
+                return b''
+            start += len(name)
+            stop = content.find(b'\n', start, end)
+            return content[start:stop if stop >= 0 else end]
+
+        author = header(b'\nauthor ')
+        if b'<' in author:
+            author = author[:author.index(b'<')]
+        date_line = b' '.join(header(b'\ncommitter ').rsplit(b' ', 2)[1:])
+
+        # The subject is the first paragraph, its lines joined by spaces
+        subject = []
+        start = end + 2
+        while start < len(content):
+            stop = content.find(b'\n', start)
+            if stop < 0:
+                stop = len(content)
+            line = content[start:stop].rstrip(b' \t\r')
+            if line:
+                subject.append(line)
+            elif subject:
+                break
+            start = stop + 1
+
+        # git log re-encodes messages to UTF-8
+        encoding = header(b'\nencoding ').decode('ascii', 'replace') or 'utf-8'
+        if encoding != 'utf-8':
+            try:
+                codecs.lookup(encoding)
+            except LookupError:
+                encoding = 'utf-8'
+
+        return [oid.hex(), parents, author.decode(encoding, 'replace'),
+                date_line.decode('ascii', 'replace'),
+                b' '.join(subject).decode(encoding, 'replace'), '>']
+
+
+def parse_commit_headers(content: bytes) -> dict:
+    """Map the header names of a commit object to lists of their values"""
+    headers = {}
+    end = content.find(b'\n\n')
+    for line in content[:end if end >= 0 else len(content)].split(b'\n'):
+        if line.startswith(b' '):
+            continue  # Continuation of a multi-line header (gpgsig, mergetag)
+        name, _, value = line.partition(b' ')
+        headers.setdefault(name, []).append(value)
+    return headers
+
+
+# Items handed over between pipeline threads at once, and batches in flight
+PIPELINE_BATCH_SIZE = 256
+PIPELINE_DEPTH = 16
+
+
+def iter_in_thread(source: Iterator, batch_size: int = PIPELINE_BATCH_SIZE,
+                   depth: int = PIPELINE_DEPTH) -> Iterator:
+    """Iterate over source in a background thread, in order.
+
+    The thread runs ahead of the consumer by at most `depth` batches of
+    `batch_size` items. Exceptions raised by source are re-raised in the
+    consumer. Closing the returned generator stops the thread and closes
+    source from it, so closing the last stage of a chain of threads tears
+    down all of them (and the git child at the start of the chain).
+    """
+    import queue
+
+    batches = queue.Queue(depth)
+    stopped = threading.Event()
+
+    def put(batch) -> bool:
+        while not stopped.is_set():
+            try:
+                batches.put(batch, timeout=0.05)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            batch = []
+            for item in source:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    if not put(batch):
+                        return
+                    batch = []
+            if put(batch):
+                put(None)
+        except BaseException as error:
+            put(error)
+        finally:
+            source.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if isinstance(batch, BaseException):
+                raise batch
+            yield from batch
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def write_lines(stream, lines: Iterable[str], threaded: bool = False):
+    """Write lines to stream as they are produced.
+
+    The iterator is closed on any error (e.g. BrokenPipeError when the
+    reader of a pipe goes away), which stops the git child feeding it.
+    With threaded, lines are written in batches by a background thread.
+    """
+    try:
+        if threaded:
+            write_in_thread(stream, lines)
+            return
+        for line in lines:
+            stream.write(line)
+            stream.write('\n')
+    finally:
+        if hasattr(lines, 'close'):
+            lines.close()
+
+
+def write_records(stream, records: Iterable[bytes]):
+    """Write binary records to a binary stream, after the stream header"""
+    try:
+        stream.write(TigStyleRendererV2.BINARY_HEADER)
+        for record in records:
+            stream.write(record)
+    finally:
+        if hasattr(records, 'close'):
+            records.close()
+
+
+def write_in_thread(stream, lines: Iterable[str], batch_size: int = PIPELINE_BATCH_SIZE,
+                    depth: int = PIPELINE_DEPTH):
+    """Write lines to stream from a background thread.
+
+    An error raised by the writer (such as BrokenPipeError) is re-raised
+    here as soon as the next batch is handed over.
+    """
+    import queue
+
+    chunks = queue.Queue(depth)
+    errors = []
+
+    def consume():
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            try:
+                stream.write(chunk)
+            except BaseException as error:
+                errors.append(error)
+                return
+
+    def put(chunk):
+        while True:
+            if errors:
+                raise errors[0]
+            try:
+                chunks.put(chunk, timeout=0.05)
+                return
+            except queue.Full:
+                pass
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    try:
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= batch_size:
+                put('\n'.join(batch) + '\n')
+                batch = []
+        if batch:
+            put('\n'.join(batch) + '\n')
+    finally:
+        # Let the writer finish what it was given, also after an error upstream
+        while thread.is_alive():
+            try:
+                chunks.put(None, timeout=0.05)
+                break
+            except queue.Full:
+                pass
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def write_stdout(lines: Iterable, threaded: bool = False, binary: bool = False):
+    """Write lines (binary records) to stdout, exiting quietly if the reader goes away"""
+    try:
+        if binary:
+            sys.stdout.flush()
+            write_records(sys.stdout.buffer, lines)
+            sys.stdout.buffer.flush()
+        else:
+            write_lines(sys.stdout, lines, threaded)
+            sys.stdout.flush()
+    except BrokenPipeError:
+        # Handle broken pipe gracefully (e.g., when piping to head, less, etc.)
+        # write_lines() has already stopped git at this point
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(0)
+
+
+class Profiler:
+    """Per-stage timings and hot-path counters reported by --profile.
+
+    attach() replaces methods of one renderer and its graph with timing and
+    counting shims, so runs without --profile are not slowed down at all.
+    Stage times are exclusive: reading git output from inside the parser
+    is counted as 'git', not as 'parse' too. With a pipelined renderer the
+    stages overlap, so their sum can exceed the wall time. The shims
+    themselves add some overhead, so totals are somewhat higher than an
+    unprofiled run.
+    """
+
+    STAGES = ('git', 'parse', 'dates', 'refs', 'layout', 'glyphs', 'lines', 'write')
+
+    # Row helpers whose cost is a scan over the columns of a row
+    SCANNING_HELPERS = (
+        'find_column_by_id', 'find_free_column', 'row_clear_commit',
+        'commit_is_in_row', 'insert_parents', 'remove_collapsed_columns',
+        'fill_empty_columns', 'commits_in_row', 'commit_next_row',
+        'continued_down', 'shift_left', 'new_column', 'continued_right',
+        'continued_left', 'parent_down', 'parent_right', 'flanked',
+        'below_commit',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.times = dict.fromkeys(self.STAGES, 0.0)
+        self.calls = dict.fromkeys(self.STAGES, 0)
+        self.local = threading.local()  # Stack of open stages, per thread
+        self.column_scans = {}
+        self.color_allocations = 0
+        self.color_releases = 0
+        self.row_widths = {}  # Maps row width to number of rows
+
+    def attach(self, renderer: 'TigStyleRendererV2'):
+        """Instrument a renderer and its graph"""
+        graph = renderer.graph
+        renderer.run_git = self.timed('git', renderer.run_git)
+        renderer.stream_git = self.timed_iter('git', renderer.stream_git)
+        renderer.iter_commits = self.timed_iter('parse', renderer.iter_commits)
+        renderer._parse_date = self.timed('dates', renderer._parse_date)
+        renderer.load_refs = self.timed('refs', renderer.load_refs)
+        renderer.iter_lines = self.timed_iter('lines', renderer.iter_lines)
+        renderer.render_to_file = self.timed('write', renderer.render_to_file)
+        graph.render_parents = self.timed('layout', self.measured(graph.render_parents))
+        graph.symbols_to_box = self.timed('glyphs', graph.symbols_to_box)
+        graph.get_color = self.counted_colors(graph.get_color)
+        graph.remove_color = self.counted_releases(graph.remove_color)
+        for name in self.SCANNING_HELPERS:
+            setattr(graph, name, self.scanning(name, graph, getattr(graph, name)))
+        graph.generate_symbols = self.scanning('generate_symbols', graph,
+                                               graph.generate_symbols, passes=3)
+
+    @property
+    def stack(self) -> list:
+        """Open stages of the current thread: [stage, start, nested time]"""
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    def enter(self, stage: str):
+        self.stack.append([stage, time.perf_counter(), 0.0])
+
+    def leave(self):
+        stack = self.stack
+        stage, start, nested = stack.pop()
+        elapsed = time.perf_counter() - start
+        self.times[stage] += elapsed - nested
+        self.calls[stage] += 1
+        if stack:
+            stack[-1][2] += elapsed
+
+    def timed(self, stage: str, func):
+        """Wrap a function so that its calls count towards stage"""
+        def timed_call(*args, **kwargs):
+            self.enter(stage)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.leave()
+        return timed_call
+
+    def timed_iter(self, stage: str, func):
+        """Wrap a generator function so that each step counts towards stage"""
+        def timed_generator(*args, **kwargs):
+            iterator = func(*args, **kwargs)
+            try:
+                while True:
+                    self.enter(stage)
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        self.leave()
+                    yield item
+            finally:
+                iterator.close()
+        return timed_generator
+
+    def measured(self, render_parents):
+        """Record the width of every row laid out by render_parents"""
+        def measured_render_parents(canvas_symbols):
+            result = render_parents(canvas_symbols)
+            width = len(canvas_symbols)
+            self.row_widths[width] = self.row_widths.get(width, 0) + 1
+            return result
+        return measured_render_parents
+
+    def counted_colors(self, get_color):
+        def counted_get_color(commit_id):
+            self.color_allocations += 1
+            return get_color(commit_id)
+        return counted_get_color
+
+    def counted_releases(self, remove_color):
+        def counted_remove_color(commit_id):
+            self.color_releases += 1
+            remove_color(commit_id)
+        return counted_remove_color
+
+    def scanning(self, name: str, graph: 'TigGraphV2', func, passes: int = 1):
+        """Count the columns a row helper scans (the width of its row)"""
+        self.column_scans[name] = 0
+
+        def scanning_call(*args):
+            row = next((arg for arg in args if isinstance(arg, GraphRow)), graph.row)
+            self.column_scans[name] += row.size * passes
+            return func(*args)
+        return scanning_call
+
+    def stop(self):
+        self.wall = time.perf_counter() - self.started
+
+    def histogram(self) -> dict:
+        """Row widths bucketed by powers of two ("1", "2-3", "4-7", ...)"""
+        buckets = {}
+        for width, rows in sorted(self.row_widths.items()):
+            low = 1 << (width.bit_length() - 1) if width else 0
+            high = 2 * low - 1 if low else 0
+            label = str(low) if low == high else f"{low}-{high}"
+            buckets[label] = buckets.get(label, 0) + rows
+        return buckets
+
+    def report(self) -> dict:
+        """Collect the measurements as a JSON-serializable dict"""
+        rows = sum(self.row_widths.values())
+        stages = {stage: {'seconds': round(self.times[stage], 6), 'calls': self.calls[stage]}
+                  for stage in self.STAGES}
+        stages['other'] = {'seconds': round(max(self.wall - sum(self.times.values()), 0.0), 6),
+                           'calls': 0}
+        return {
+            'wall_seconds': round(self.wall, 6),
+            'stages': stages,
+            'rows': rows,
+            'row_width': {
+                'max': max(self.row_widths, default=0),
+                'mean': round(sum(w * n for w, n in self.row_widths.items()) / rows, 2) if rows else 0,
+                'histogram': self.histogram(),
+            },
+            'column_scans': dict(self.column_scans, total=sum(self.column_scans.values())),
+            'color_allocations': self.color_allocations,
+            'color_releases': self.color_releases,
+        }
+
+    def format_report(self) -> str:
+        """Format the measurements as a human readable table"""
+        report = self.report()
+        wall = report['wall_seconds']
+        lines = [f"pyggg profile: {wall:.3f}s wall, {report['rows']} rows", '',
+                 f"  {'stage':<8} {'seconds':>9} {'share':>6} {'calls':>9}"]
+        for stage, entry in report['stages'].items():
+            share = entry['seconds'] / wall * 100 if wall else 0.0
+            lines.append(f"  {stage:<8} {entry['seconds']:>9.3f} {share:>5.1f}% {entry['calls']:>9}")
+
+        widths = report['row_width']
+        lines += ['', f"  row width: max {widths['max']}, mean {widths['mean']}"]
+        for label, rows in widths['histogram'].items():
+            lines.append(f"  {label:>11} {rows:>9}")
+
+        lines += ['', '  column scans:']
+        for name, scans in report['column_scans'].items():
+            if scans:
+                lines.append(f"  {name:>24} {scans:>12}")
+        lines += ['', f"  color allocations: {report['color_allocations']}",
+                  f"  color releases:    {report['color_releases']}"]
+        return '\n'.join(lines)
+
+
+def ref_fingerprint(git_dir: str, common_dir: str) -> tuple:
+    """Identify the state of the refs of a repository without running git.
+
+    Stats every file a ref can live in: loose refs, packed-refs, reftables,
+    the HEADs of all worktrees and the shallow file. Git replaces these
+    files (by renaming a lock file) whenever a ref moves, so any update
+    changes their inode, size or modification time.
+    """
+    paths = []
+    for directory in dict.fromkeys([git_dir, common_dir]):
+        paths += [os.path.join(directory, name) for name in ('HEAD', 'packed-refs', 'shallow')]
+        for subdirectory in ('refs', 'reftable'):
+            for root, dirs, files in os.walk(os.path.join(directory, subdirectory)):
+                dirs.sort()
+                paths += [os.path.join(root, name) for name in sorted(files)]
+    worktrees = os.path.join(common_dir, 'worktrees')
+    if os.path.isdir(worktrees):
+        paths += [os.path.join(worktrees, name, 'HEAD') for name in sorted(os.listdir(worktrees))]
+
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            fingerprint.append((path, None))
+            continue
+        fingerprint.append((path, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+class GraphCache:
+    """The laid out history of one repository, kept between requests.
+
+    Commits are only laid out as far as requests reach: the rest of the
+    log waits in the suspended commit generator (and git with it).
+    """
+
+    def __init__(self, renderer: TigStyleRendererV2, fingerprint: tuple):
+        self.renderer = renderer
+        self.fingerprint = fingerprint  # ref_fingerprint() before git started
+        self.commits = CommitStore()  # Laid out commits, in output order
+        self.rows = []  # Their (symbols, lane, folded), see format_commit
+        self.pending = renderer.iter_commits()
+        self.lock = threading.Lock()
+
+    def extend(self, count: Optional[int]):
+        """Lay out commits until `count` of them (or all, with None) are cached"""
+        if self.pending is None:
+            return
+        missing = None if count is None else count - len(self.commits)
+        if missing is not None and missing <= 0:
+            return
+
+        renderer = self.renderer
+        graph = renderer.graph
+        for commit in itertools.islice(self.pending, missing):
+            self.commits.append(commit)
+            symbols = array('i', renderer.layout_commit(commit))
+            self.rows.append((symbols, graph.prev_position, bool(graph.folded)))
+        if count is None or len(self.commits) < count:
+            # History exhausted
+            self.close()
+
+    def close(self):
+        """Stop git if it is still running"""
+        if self.pending is not None:
+            self.pending.close()
+            self.pending = None
+
+    def lines(self, author_width: Optional[int] = None, skip: int = 0,
+              max_count: Optional[int] = None, output_format: str = 'text') -> List[str]:
+        """Output lines of a window, as TigStyleRendererV2.iter_lines yields them"""
+        with self.lock:
+            self.extend(None if max_count is None else skip + max_count)
+            end = None if max_count is None else skip + max_count
+            commits = self.commits[skip:end]
+            rows = self.rows[skip:end]
+
+            renderer = self.renderer
+            if output_format == 'json':
+                return [renderer.format_record(commit, *row) for commit, row in zip(commits, rows)]
+            # The abbreviations depend on the window, so formatting holds the lock too
+            size = self.commits.hash_len
+            if author_width is None:
+                author_width = renderer.author_column_width(commits)
+                renderer.find_abbreviations(self.commits.hashes[skip * size:(skip + len(commits)) * size],
+                                            size, skip == 0 and max_count is None)
             else:
-                local_branches.append(f'[{ref}]')
+                renderer.find_abbreviations(None, size, False)
+            return [renderer.format_line(commit, renderer.format_graph(symbols, folded), author_width)
+                    for commit, (symbols, _, folded) in zip(commits, rows)]
+
+
+class GraphServer:
+    """Render graphs for local clients, keeping layouts in memory.
+
+    Each client sends one JSON request line (see request_options) and gets
+    back a JSON header line, {"ok": true} or {"error": message}, followed by
+    the output lines. Layouts are cached per repository and settings and
+    reused until the ref tips move, so repeated requests run neither git
+    nor the layout.
+
+    Connections are accepted by a threading socketserver (`listener`),
+    which calls handle() for each of them.
+    """
+
+    CACHE_SIZE = 32  # Layouts kept, least recently used dropped first
+
+    def __init__(self, socket_path: str):
+        import socketserver
+
+        self.listener = socketserver.ThreadingUnixStreamServer(socket_path, self.handle)
+        self.listener.daemon_threads = True
+        os.chmod(socket_path, 0o600)
+        self.caches = {}  # Settings -> GraphCache, least recently used first
+        self.git_dirs = {}  # Repository path -> (git dir, common dir)
+        self.lock = threading.Lock()
+
+    def locate(self, repo_path: str):
+        """Return the git dir and common dir of a repository"""
+        dirs = self.git_dirs.get(repo_path)
+        if dirs is None:
+            result = subprocess.run(['git', '-C', repo_path, 'rev-parse', '--git-dir', '--git-common-dir'],
+                                    capture_output=True, text=True, check=True)
+            dirs = tuple(os.path.join(repo_path, path) for path in result.stdout.splitlines())
+            self.git_dirs[repo_path] = dirs
+        return dirs
+
+    def render(self, request: dict) -> List[str]:
+        """Output lines for a request"""
+        import json
+
+        repo_path = os.path.realpath(request['repo'])
+        fingerprint = ref_fingerprint(*self.locate(repo_path))
+        settings = [repo_path, request.get('engine', 'auto'), request.get('source', 'git'),
+                    request.get('revisions', ['--all']), bool(request.get('local_dates')),
+                    request.get('max_columns', 0), bool(request.get('unique_hashes'))]
+        window = (request.get('author_width'), request.get('skip', 0),
+                  request.get('max_count'), request.get('format', 'text'))
+
+        renderer = TigStyleRendererV2(*settings[:2])
+        (renderer.source, renderer.revision_args, renderer.local_dates, renderer.graph.max_columns,
+         renderer.unique_hashes) = settings[2:]
+        if renderer.date_limited():
+            cache = GraphCache(renderer, fingerprint)
+            try:
+                return cache.lines(*window)
+            finally:
+                cache.close()
+
+        key = json.dumps(settings)
+        with self.lock:
+            cache = self.caches.pop(key, None)
+            if cache is not None and cache.fingerprint != fingerprint:
+                cache.close()
+                cache = None
+            if cache is None:
+                cache = GraphCache(renderer, fingerprint)
+            self.caches[key] = cache
+            while len(self.caches) > self.CACHE_SIZE:
+                self.caches.pop(next(iter(self.caches))).close()
+        try:
+            return cache.lines(*window)
+        except Exception:
+            # A failed layout (bad revision, ...) isn't kept: the next request
+            # runs git again and reports its error too
+            with self.lock:
+                if self.caches.get(key) is cache:
+                    del self.caches[key]
+            cache.close()
+            raise
+
+    def handle(self, connection, client_address, listener):
+        """Answer the request of one client (in its own thread)"""
+        import json
 
-        return local_branches + remote_branches + tags
+        try:
+            with connection.makefile('rb') as rfile:
+                request = rfile.readline()
+            lines = self.render(json.loads(request))
+            header = {'ok': True}
+        except subprocess.CalledProcessError as e:
+            lines, header = [], {'error': (e.stderr or f"fatal: {e}").strip()}
+        except (ValueError, KeyError, TypeError, ImportError, OSError) as e:
+            lines, header = [], {'error': f"fatal: {e or type(e).__name__}"}
 
-    def render(self) -> str:
-        """Render the complete log"""
-        commits = self.get_commits()
-        output_lines = []
+        try:
+            connection.sendall((json.dumps(header) + '\n').encode())
+            for start in range(0, len(lines), PIPELINE_BATCH_SIZE):
+                batch = lines[start:start + PIPELINE_BATCH_SIZE]
+                connection.sendall(('\n'.join(batch) + '\n').encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client went away
+
+
+def serve(socket_path: str):
+    """Run a GraphServer on a Unix socket until interrupted"""
+    if os.path.exists(socket_path):
+        # Replace the socket of a server that is gone, but not a live one
+        try:
+            connect_server(socket_path).close()
+        except OSError:
+            os.unlink(socket_path)
+        else:
+            raise OSError(f"a server is already listening on {socket_path}")
 
-        # Calculate max author length
-        max_author_len = min(max((len(c.author) for c in commits), default=20), 40)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = GraphServer(socket_path)
+    try:
+        server.listener.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.listener.server_close()
+        os.unlink(socket_path)
+        for cache in server.caches.values():
+            cache.close()
 
-        for commit in commits:
-            # Add commit to graph
-            self.graph.add_commit(commit.hash, commit.parents, is_boundary=False)
 
-            # Render graph for this commit
-            canvas_symbols = []
-            self.graph.render_parents(canvas_symbols)
+class ServerError(Exception):
+    """A request rejected by the graph server"""
 
-            # Convert symbols to string (use symbol_to_box for standard box-drawing chars)
-            graph_str = ''.join(self.graph.symbol_to_box(sym) for sym in canvas_symbols).rstrip()
 
-            # Format output line (timezone omitted, all dates are in UTC)
-            author = commit.author[:max_author_len].ljust(max_author_len)
-            refs_str = ' ' + ' '.join(commit.refs) if commit.refs else ''
-            line = f"{commit.short_hash} {commit.date} {author} {graph_str}{refs_str} {commit.message}"
-            output_lines.append(line)
+def connect_server(socket_path: str) -> socket.socket:
+    """Connect to a GraphServer (OSError if none is listening)"""
+    import socket
 
-        return '\n'.join(output_lines)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request_options(options: 'Options') -> dict:
+    """The GraphServer request for command line options"""
+    return {
+        'repo': os.path.abspath(options.repo_path),
+        'engine': options.engine,
+        'source': options.source,
+        'revisions': (options.revisions or ['--all']) + options.limits,
+        'local_dates': options.local_dates,
+        'max_columns': options.max_columns,
+        'unique_hashes': options.unique_hashes,
+        'author_width': options.author_width,
+        'skip': options.skip,
+        'max_count': options.max_count,
+        'format': options.output_format,
+    }
+
+
+def iter_server_lines(sock: socket.socket, request: dict) -> Iterator[str]:
+    """Send a request to a GraphServer and yield the output lines"""
+    import json
+
+    with sock, sock.makefile('r', encoding='utf-8', newline='\n') as f:
+        sock.sendall((json.dumps(request) + '\n').encode())
+        header = json.loads(f.readline() or '{"error": "fatal: no response from server"}')
+        if 'error' in header:
+            raise ServerError(header['error'])
+        for line in f:
+            yield line[:-1]
+
+
+class RenderTimeout(Exception):
+    """Raised in a batch worker when a repository takes too long"""
+
+
+def is_repository(path: str) -> bool:
+    """Whether path is the top of a work tree or a bare repository"""
+    return (os.path.exists(os.path.join(path, '.git')) or
+            (os.path.isfile(os.path.join(path, 'HEAD')) and os.path.isdir(os.path.join(path, 'objects'))
+             and os.path.isdir(os.path.join(path, 'refs'))))
+
+
+def find_git_dirs(path: str) -> Optional[tuple]:
+    """The git dir and common dir of the repository at or above path, found without running git.
+
+    Covers the layouts git discovers: $GIT_DIR, a .git directory, a .git
+    file pointing at the git dir of a worktree or submodule, and bare
+    repositories, with `commondir` (or $GIT_COMMON_DIR) leading from a
+    worktree to its main repository. None when nothing is found.
+    """
+    git_dir = os.environ.get('GIT_DIR')
+    if git_dir:
+        git_dir = os.path.join(path, git_dir)
+    else:
+        directory = os.path.abspath(path)
+        while not is_repository(directory):
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
+        git_dir = os.path.join(directory, '.git')
+        if os.path.isfile(git_dir):
+            try:
+                with open(git_dir) as f:
+                    link = f.read().strip()
+            except OSError:
+                return None
+            if not link.startswith('gitdir:'):
+                return None
+            git_dir = os.path.join(directory, link[7:].strip())
+        elif not os.path.isdir(git_dir):
+            git_dir = directory
+
+    common_dir = os.environ.get('GIT_COMMON_DIR')
+    if common_dir:
+        return git_dir, os.path.join(path, common_dir)
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            return git_dir, os.path.join(git_dir, f.read().strip())
+    except OSError:
+        return git_dir, git_dir
+
+
+def find_repositories(paths: List[str]) -> List[str]:
+    """Repositories among paths, and within those that are directories of them"""
+    repos = []
+    for path in paths:
+        found = []
+        if not is_repository(path):
+            for root, dirs, _ in os.walk(path):
+                dirs.sort()
+                subdirs = [os.path.join(root, name) for name in dirs if not name.startswith('.')]
+                found += [subdir for subdir in subdirs if is_repository(subdir)]
+                # Do not look inside repositories
+                dirs[:] = [os.path.basename(subdir) for subdir in subdirs if not is_repository(subdir)]
+        # A path that holds no repository is reported as failing on its own
+        repos += found or [path]
+    return repos
+
+
+def output_names(repos: List[str], extension: str) -> List[str]:
+    """Distinct output file names for repositories, from their directory names"""
+    names = []
+    taken = set()
+    for repo in repos:
+        base = os.path.basename(os.path.abspath(repo))
+        if base.endswith('.git') and len(base) > 4:
+            base = base[:-4]
+        name = base + extension
+        suffix = 1
+        while name in taken:
+            suffix += 1
+            name = f"{base}-{suffix}{extension}"
+        taken.add(name)
+        names.append(name)
+    return names
+
+
+# The renderer and window of a batch worker process, see batch_init
+batch_renderer = None
+batch_window = None
+
+
+def batch_init(settings: dict, window: tuple):
+    """Create the renderer a batch worker uses for all its repositories"""
+    global batch_renderer, batch_window
+    batch_renderer = TigStyleRendererV2('.', settings['engine'])
+    batch_renderer.graph.max_columns = settings['max_columns']
+    for name in ('source', 'revision_args', 'local_dates', 'unique_hashes', 'output_format', 'compress_linear',
+                 'checkpoint_interval'):
+        setattr(batch_renderer, name, settings[name])
+    batch_window = window
+    # Ctrl-C is handled by the parent, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def batch_render(task: tuple) -> dict:
+    """Render one repository of a batch into its output file"""
+    repo, output_path, timeout = task
+    result = {'repo': repo, 'output': output_path, 'status': 'ok', 'commits': 0, 'error': None}
+    start = time.perf_counter()
+
+    def expire(signum, frame):
+        raise RenderTimeout()
+
+    signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        batch_renderer.reset(repo)
+        lines = batch_renderer.iter_lines(*batch_window)
+        binary = batch_renderer.output_format == 'binary'
+        try:
+            with open(output_path, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+                if binary:
+                    f.write(batch_renderer.BINARY_HEADER)
+                for line in lines:
+                    f.write(line)
+                    if not binary:
+                        f.write('\n')
+                    result['commits'] += 1
+        finally:
+            # Stops git when rendering failed half way
+            lines.close()
+    except RenderTimeout:
+        result.update(status='timeout', error=f"timed out after {timeout:g}s")
+    except subprocess.CalledProcessError as e:
+        result.update(status='failed', error=(e.stderr or str(e)).strip())
+    except Exception as e:  # One broken repository must not stop the batch
+        result.update(status='failed', error=f"{type(e).__name__}: {e}")
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    if result['status'] != 'ok':
+        result['commits'] = 0
+        try:
+            os.unlink(output_path)  # Never leave a partial graph behind
+        except OSError:
+            pass
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def render_batch(paths: List[str], output_dir: str, settings: dict, window: tuple,
+                 jobs: int = 0, timeout: float = 0) -> dict:
+    """Render many repositories in parallel, one file each, into output_dir.
+
+    Repositories are spread over `jobs` worker processes (one per CPU by
+    default), each reusing a single TigStyleRendererV2. A repository still
+    rendering after `timeout` seconds (0 for no limit) is abandoned. The
+    summary returned, also written to summary.json, lists the time taken
+    and the outcome for each repository.
+    """
+    import json
+    import multiprocessing
+
+    repos = find_repositories(paths)
+    extension = {'json': '.jsonl', 'binary': '.ggg'}.get(settings['output_format'], '.txt')
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(repo, os.path.join(output_dir, name), timeout)
+             for repo, name in zip(repos, output_names(repos, extension))]
+    jobs = min(jobs or os.cpu_count() or 1, max(len(tasks), 1))
+
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(jobs, batch_init, (settings, window))
+    try:
+        results = list(pool.imap_unordered(batch_render, tasks))
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    order = {task[0]: index for index, task in enumerate(tasks)}
+    results.sort(key=lambda result: order[result['repo']])
+    summary = {
+        'jobs': jobs,
+        'seconds': round(time.perf_counter() - start, 3),
+        'repositories': len(results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'results': results,
+    }
+    with open(os.path.join(output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+    return summary
+
+
+def format_batch_summary(summary: dict) -> str:
+    """Human-readable version of a render_batch summary"""
+    lines = [f"{summary['repositories'] - summary['failed']}/{summary['repositories']} repositories "
+             f"rendered in {summary['seconds']:.1f}s with {summary['jobs']} jobs"]
+    for result in summary['results']:
+        if result['status'] != 'ok':
+            lines.append(f"  {result['status']}: {result['repo']}: {result['error']}")
+    return '\n'.join(lines)
+
+
+def same_layout(state: dict, other: dict, colors: bool = True) -> bool:
+    """Whether two save_state() snapshots lay out the following commits alike.
+
+    Placeholders of commits already laid out ('#<id>') differ between
+    renderers, so they are renamed in order of appearance: all that matters
+    is telling them apart. With colors False, states that only assign other
+    colors count as the same: text output does not show them.
+    """
+    def canonical(state):
+        names = {}
+
+        def name(token):
+            if isinstance(token, str) and token.startswith('#'):
+                return names.setdefault(token, f'#{len(names)}')
+            return token
+
+        rows = [[name(token) for token in row] for row in state['rows']]
+        folded = sorted(map(str, map(name, state['folded'])))
+        if not colors:
+            flags_mask = GraphSymbol.FLAGS_MASK
+            symbols = [[symbol & flags_mask for symbol in row] for row in state['symbols']]
+            return rows, symbols, state['prev_position'], folded
+        # A placeholder found only in the color map never comes back; only
+        # the color it holds still counts
+        colors_map = sorted(repr((names.get(token, '#') if isinstance(token, str) and token.startswith('#')
+                                  else token, color)) for token, color in state['colors_map'])
+        return rows, state['symbols'], state['prev_position'], colors_map, state['colors_count'], folded
+
+    return canonical(state) == canonical(other)
+
+
+class GraphWatch:
+    """The output window of a repository, kept up to date as its refs move.
+
+    Holds the parsed commits down to the end of the window, the rows and
+    output lines of the window itself, and layout states: each commit whose
+    distance to the end of the order is a multiple of the largest power of
+    two up to its index (at most STATE_INTERVAL) has one, so that states of
+    the shared tail keep lining up as new commits come in.
+
+    On update(), `git rev-list` gives the new commit order. The longest tail
+    it shares with the previous order (everything below the new commits when
+    branches only moved forward) is not parsed again, and is only laid out
+    again until the layout state matches a saved one: from there on every
+    row is drawn as before and its line is reused, unless its refs or the
+    author column width changed.
+    """
+
+    STATE_INTERVAL = 1024
+
+    def __init__(self, renderer: TigStyleRendererV2, author_width: Optional[int] = None,
+                 skip: int = 0, max_count: Optional[int] = None):
+        self.renderer = renderer
+        self.author_width = author_width  # None sizes it to the window
+        self.skip = skip
+        self.max_count = max_count
+        self.order = b''  # Packed hashes of all commits, in output order
+        self.boundary = b''  # Whether each of them is a boundary commit
+        self.commits = CommitStore()  # Commits down to the end of the window
+        self.rows = []  # (symbols, lane, folded) of each row of the window
+        self.lines = []  # Output lines (or records) of the window
+        self.states = {}  # Commit index -> save_state() before that commit
+        self.refs = {}  # renderer.refs the lines were formatted with
+        self.abbreviations = {}  # renderer.abbreviations the lines were formatted with
+        self.width = None  # Author column width of the lines
+
+    def tips(self, git_dir: str) -> str:
+        """The ref tips and what HEAD points to, to tell whether anything moved"""
+        try:
+            with open(os.path.join(git_dir, 'HEAD')) as f:
+                head = f.read()
+        except OSError:
+            head = ''
+        try:
+            return head + self.renderer.run_git(['show-ref', '--head'])
+        except subprocess.CalledProcessError:
+            return head  # No refs at all
+
+    def read_order(self):
+        """Return (packed hashes, boundary flags) of all commits, in output order"""
+        tokens = self.renderer.run_git(['rev-list', '--topo-order'] + self.renderer.revision_args + ['--']).split()
+        boundary = bytes(token[0] == '-' for token in tokens)
+        return bytes.fromhex(''.join(token.lstrip('-') for token in tokens)), boundary
+
+    def shared_tail(self, order: bytes, boundary: bytes, size: int) -> int:
+        """Number of commits ending both the old and the new order"""
+        old, new = memoryview(self.order), memoryview(order)
+        low, high = 0, min(len(self.boundary), len(boundary))
+        # The longest equal suffix, by binary search
+        while low < high:
+            count = (low + high + 1) // 2
+            if (old[len(old) - count * size:] == new[len(new) - count * size:] and
+                    self.boundary[-count:] == boundary[-count:]):
+                low = count
+            else:
+                high = count - 1
+        return low
+
+    def update(self) -> bool:
+        """Render the window again for the current refs.
+
+        Returns False, keeping the previous output, if the refs moved again
+        while git was running; the caller should retry.
+        """
+        renderer = self.renderer
+        renderer.reset(renderer.repo_path)
+        order, boundary = self.read_order()
+        count = len(boundary)
+        size = len(order) // count if count else 0
+        skip = self.skip
+        end = count if self.max_count is None else min(count, skip + self.max_count)
+
+        # Below its first `fresh` commits, the new order is the old one from
+        # `fresh + shift` on
+        shared = 0 if renderer.date_limited() or not self.states else self.shared_tail(order, boundary, size)
+        fresh = count - shared
+        shift = len(self.boundary) - count
+        if shift > 0:
+            # Commits went away: the end of the window was never laid out
+            fresh, shift = count, 0
+
+        commits = CommitStore()
+        rows = []
+        states = {}
+
+        def lay_out(index: int, commit: Commit):
+            step = min(1 << index.bit_length() >> 1, self.STATE_INTERVAL) or 1
+            if (count - index) % step == 0:
+                states[index] = renderer.save_state()
+            commits.append(commit)
+            symbols = renderer.layout_commit(commit)
+            if index >= skip:
+                rows.append((array('i', symbols), renderer.graph.prev_position, bool(renderer.graph.folded)))
 
-    def render_to_file(self, output_path: str):
-        """Render to file"""
-        output = self.render()
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(output)
-            f.writelines('\n')  # Ensure final newline
+        # New commits (and old ones that moved) are parsed from git log
+        index = 0
+        parsed = renderer.iter_commits()
+        try:
+            for commit in itertools.islice(parsed, min(fresh, end)):
+                if (bytes.fromhex(commit.hash) != order[index * size:(index + 1) * size] or
+                        commit.is_boundary != boundary[index]):
+                    return False
+                lay_out(index, commit)
+                index += 1
+        finally:
+            parsed.close()
+        if index < min(fresh, end):
+            return False
+        if not index:
+            renderer.refs = renderer.load_refs()
+        refs = renderer.refs
+        if renderer.output_format == 'text':
+            whole = skip == 0 and self.max_count is None
+            if renderer.unique_hashes and whole and renderer.revision_args == ['--all']:
+                # The order already lists every commit
+                renderer.abbreviations = long_abbreviations(order, size)
+            else:
+                renderer.find_abbreviations(None if self.author_width else order[skip * size:end * size],
+                                            size, whole)
+        abbreviations = renderer.abbreviations
+
+        # The others are laid out again until the layout is the same as
+        # before, then only as far as the rows above the old window
+        converged = False
+        while index < end:
+            old_index = index + shift
+            if not converged and old_index in self.states:
+                converged = same_layout(renderer.save_state(), self.states[old_index],
+                                        renderer.output_format != 'text')
+                if converged:
+                    # Skip ahead to the last saved state above the old window
+                    target = max(i for i in self.states if old_index <= i <= max(skip + shift, old_index))
+                    if target > old_index:
+                        commits.extend_store(self.commits, old_index, target)
+                        states.update((i - shift, state) for i, state in self.states.items()
+                                      if old_index <= i < target)
+                        renderer.reset(renderer.repo_path)
+                        renderer.refs = refs
+                        renderer.load_state(self.states[target])
+                        index, old_index = target - shift, target
+            if converged and old_index >= skip:
+                break
+            commit = self.commits[old_index]
+            commit.id = renderer.intern_id(commit.hash)
+            commit.parent_ids = [renderer.intern_id(parent) for parent in commit.parents]
+            commit.refs = refs.get(commit.hash, [])
+            lay_out(index, commit)
+            index += 1
+
+        # The rest of the window is drawn exactly as before
+        reused = index
+        old_rows = slice(reused + shift - skip, end + shift - skip)
+        if reused < end:
+            commits.extend_store(self.commits, reused + shift, end + shift)
+            rows += self.rows[old_rows]
+            states.update((i - shift, state) for i, state in self.states.items() if i >= reused + shift)
+
+        if self.author_width is not None:
+            width = self.author_width
+        else:
+            # Authors of the window only, as in iter_lines
+            authors = set(commits.author_ids[skip:])
+            width = min(max((len(commits.authors[author]) for author in authors), default=20), 40)
+
+        lines = [self.format(commits, rows, i, width) for i in range(skip, reused)]
+        if width != self.width:
+            lines += [self.format(commits, rows, i, width) for i in range(reused, end)]
+        elif reused < end:
+            old_lines = self.lines[old_rows]
+            # Only the lines of commits whose refs or short hash changed are redone
+            changed = {commit_hash for commit_hash in set(self.refs) | set(refs)
+                       if self.refs.get(commit_hash) != refs.get(commit_hash)}
+            changed.update(commit_hash for commit_hash in set(self.abbreviations) | set(abbreviations)
+                           if self.abbreviations.get(commit_hash) != abbreviations.get(commit_hash))
+            for commit_hash in changed:
+                i = self.find(order, size, bytes.fromhex(commit_hash))
+                if i is not None and reused <= i < end:
+                    old_lines[i - reused] = self.format(commits, rows, i, width)
+            lines += old_lines
+
+        self.order, self.boundary = order, boundary
+        self.commits, self.rows, self.lines, self.states = commits, rows, lines, states
+        self.refs, self.abbreviations, self.width = refs, abbreviations, width
+        return True
+
+    def format(self, commits: CommitStore, rows: list, index: int, width: int):
+        """Format the line of commit `index` with the current refs"""
+        commit = commits[index]
+        commit.refs = self.renderer.refs.get(commit.hash, [])
+        return self.renderer.format_row(commit, *rows[index - self.skip], width)
+
+    @staticmethod
+    def find(order: bytes, size: int, commit_hash: bytes) -> Optional[int]:
+        """Index of a packed hash in a packed order, None if it isn't there"""
+        position = order.find(commit_hash)
+        while position >= 0 and position % size:
+            position = order.find(commit_hash, position + 1)
+        return None if position < 0 else position // size
 
 
 def print_usage(prog_name):
@@ -875,6 +3802,66 @@ ARGUMENTS:
 
 OPTIONS:
     -h, --help      Show this help message
+    -w, --author-width N
+                    Fixed author column width. Lines are written as soon as
+                    each commit is laid out instead of after scanning all
+                    authors (default: longest author name, up to 40)
+    --skip N        Skip the first N commits
+    -n, --max-count N
+                    Print at most N commits
+    --checkpoint-interval N
+                    Commits between the layout checkpoints used to resume
+                    --skip windows without replaying the history
+                    (default: 10000, 0 disables checkpoints)
+    --engine ENGINE Layout engine: auto, python or numpy (default: auto,
+                    which vectorizes wide rows when NumPy is installed)
+    --format FORMAT Output format: text, json for one JSON object per commit
+                    with the glyph, color and flags of each graph column, or
+                    binary for length-prefixed binary records (default: text)
+    --max-columns N Draw at most N graph columns, folding the others into
+                    one marker column (default: 0, no limit)
+    --compress-linear N
+                    Show runs of more than N linear commits, whose rows only
+                    continue one lane, as one "… 1,234 commits …" row
+    -r, --revisions REVS
+                    Revision range or ref to show instead of all refs, e.g.
+                    v1.0..release/x or ^main (repeatable)
+    --branches[=PATTERN], --tags[=PATTERN], --remotes[=PATTERN], --glob=PATTERN
+                    Show the refs matching a pattern instead of all refs, as
+                    in git log (repeatable)
+    --since DATE, --until DATE
+                    Show commits more recent or older than a date
+    --boundary      Also show the commits just outside the range
+    --source SOURCE Where commits are read from: git (run git log) or native
+                    (read the commit-graph and objects directly, falling
+                    back to git log when the repository has no commit-graph)
+                    (default: git)
+    --local-dates   Show dates in the committer's time zone, followed by its
+                    offset, instead of UTC
+    --unique-hashes Make short hashes unique among all commits of the
+                    repository, not only those shown, listing them all first
+    --pipeline      Read git output and parse commits in background threads,
+                    and write output from another, overlapping them with the
+                    graph layout
+    --profile[=json]
+                    Report time spent per stage (git, parsing, dates, refs,
+                    layout, glyphs, output) and hot-path counters on stderr
+    --batch DIR     Render each repository given as argument, or found in a
+                    directory given as argument, into a file in DIR, in
+                    parallel, and write DIR/summary.json
+    -j, --jobs N    Worker processes for --batch (default: one per CPU)
+    --timeout SECONDS
+                    Give up on a repository of --batch after SECONDS
+                    (default: 0, no limit)
+    --serve SOCKET  Run a graph server on a Unix socket, keeping the layout
+                    of each repository in memory until its refs move
+    --connect SOCKET
+                    Ask the graph server on SOCKET for the output, rendering
+                    locally if none is running
+    --watch[=SECONDS]
+                    Keep the output up to date: check the refs every SECONDS
+                    (default: 1) and render again when they move, reusing
+                    the lines below the new commits
     --              End of options (use if repo path starts with '-')
 
 EXAMPLES:
@@ -883,7 +3870,12 @@ EXAMPLES:
     {prog_name} /path/to/repo out.txt   # Specified repo → file
     {prog_name} > output.txt            # Current directory → file
     {prog_name} | less -S               # Pipe to less (or use 'gg' wrapper)
+    {prog_name} -w 20 | head -20        # First lines without reading all history
+    {prog_name} --skip 500000 -n 100    # Commits 500000-500099
+    {prog_name} -r v1.0..release/x --boundary
+                                        # What changed on release/x since v1.0
     {prog_name} -- -weird/repo          # Repo path starting with '-'
+    {prog_name} --batch out/ -j 8 ~/src # Every repository under ~/src
 
 INSTALLED COMMANDS:
     ggg             Generate git graph to stdout
@@ -894,69 +3886,351 @@ For more information, see README.md or CLAUDE.md in the repository.
     print(usage)
 
 
-def main():
-    # Parse arguments
-    prog_name = os.path.basename(sys.argv[0])  # Get actual command name used
-    args = sys.argv[1:]  # Skip program name
+class Options:
+    """Parsed command line options"""
 
-    # Check for flags first (before '--' separator)
-    if args and args[0].startswith('-'):
-        flag = args[0]
-        if flag in ('-h', '--help'):
+    def __init__(self):
+        self.repo_path = '.'
+        self.output_file = None
+        self.author_width = None
+        self.skip = 0
+        self.max_count = None
+        self.checkpoint_interval = None
+        self.engine = 'auto'
+        self.max_columns = 0
+        self.compress_linear = None
+        self.source = 'git'
+        self.local_dates = False
+        self.unique_hashes = False
+        self.pipeline = False
+        self.profile = None
+        self.revisions = []  # Revision ranges and ref patterns, --all if empty
+        self.limits = []  # --since, --until and --boundary
+        self.output_format = 'text'
+        self.serve = None  # Socket path to serve graphs on
+        self.connect = None  # Socket path of a graph server to ask
+        self.batch = None  # Output directory of a batch of repositories
+        self.jobs = 0
+        self.timeout = 0.0
+        self.watch = None  # Seconds between checks of the refs
+        self.paths = []  # All positional arguments
+
+
+def usage_error(prog_name: str, message: str):
+    """Report a command line error and exit"""
+    print(f"{prog_name}: {message}", file=sys.stderr)
+    print(f"Try '{prog_name} --help' for more information.", file=sys.stderr)
+    sys.exit(1)
+
+
+def parse_count(prog_name: str, flag: str, value: str) -> int:
+    """Parse a non-negative integer option value"""
+    try:
+        count = int(value)
+    except ValueError:
+        count = -1
+    if count < 0:
+        usage_error(prog_name, f"invalid value for {flag}: {value}")
+    return count
+
+
+def parse_args(prog_name: str, args: List[str]) -> Options:
+    """Parse options and positional arguments"""
+    options = Options()
+    positional = []
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        i += 1
+
+        if arg == '--':
+            # '--' separates options from arguments
+            positional.extend(args[i:])
+            break
+        if not arg.startswith('-') or arg == '-':
+            positional.append(arg)
+            continue
+
+        # Options taking a value accept both "--opt value" and "--opt=value"
+        flag, has_value, value = arg.partition('=')
+
+        def take_value():
+            nonlocal i
+            if has_value:
+                return value
+            if i >= len(args):
+                usage_error(prog_name, f"option requires an argument: {flag}")
+            i += 1
+            return args[i - 1]
+
+        if arg in ('-h', '--help'):
             print_usage(prog_name)
             sys.exit(0)
-        elif flag == '--':
-            # '--' separates options from arguments
-            args = args[1:]  # Remove the '--' itself
+        elif flag in ('-w', '--author-width'):
+            options.author_width = parse_count(prog_name, flag, take_value())
+        elif flag == '--skip':
+            options.skip = parse_count(prog_name, flag, take_value())
+        elif flag in ('-n', '--max-count'):
+            options.max_count = parse_count(prog_name, flag, take_value())
+        elif flag == '--checkpoint-interval':
+            options.checkpoint_interval = parse_count(prog_name, flag, take_value())
+        elif flag == '--engine':
+            options.engine = take_value()
+            if options.engine not in ('auto', 'python', 'numpy'):
+                usage_error(prog_name, f"invalid value for {flag}: {options.engine}")
+        elif flag == '--max-columns':
+            options.max_columns = parse_count(prog_name, flag, take_value())
+        elif flag == '--compress-linear':
+            options.compress_linear = parse_count(prog_name, flag, take_value())
+        elif flag == '--source':
+            options.source = take_value()
+            if options.source not in ('git', 'native'):
+                usage_error(prog_name, f"invalid value for {flag}: {options.source}")
+        elif arg == '--local-dates':
+            options.local_dates = True
+        elif arg == '--unique-hashes':
+            options.unique_hashes = True
+        elif arg == '--pipeline':
+            options.pipeline = True
+        elif flag in ('-r', '--revisions'):
+            revision = take_value()
+            if revision.startswith('-'):
+                usage_error(prog_name, f"invalid value for {flag}: {revision}")
+            options.revisions.append(revision)
+        elif flag in ('--branches', '--tags', '--remotes'):
+            # The pattern is optional, so only "--branches=PATTERN" takes one
+            options.revisions.append(arg)
+        elif flag == '--glob':
+            options.revisions.append(f'--glob={take_value()}')
+        elif flag in ('--since', '--until'):
+            options.limits.append(f'{flag}={take_value()}')
+        elif arg == '--boundary':
+            options.limits.append(arg)
+        elif flag == '--format':
+            options.output_format = take_value()
+            if options.output_format not in ('text', 'json', 'binary'):
+                usage_error(prog_name, f"invalid value for {flag}: {options.output_format}")
+        elif flag == '--batch':
+            options.batch = take_value()
+        elif flag in ('-j', '--jobs'):
+            options.jobs = parse_count(prog_name, flag, take_value())
+        elif flag == '--timeout':
+            timeout = take_value()
+            try:
+                options.timeout = float(timeout)
+            except ValueError:
+                options.timeout = -1.0
+            if not options.timeout >= 0:
+                usage_error(prog_name, f"invalid value for {flag}: {timeout}")
+        elif flag == '--serve':
+            options.serve = take_value()
+        elif flag == '--connect':
+            options.connect = take_value()
+        elif flag == '--watch':
+            # The value is optional, so only "--watch=SECONDS" takes one
+            interval = value if has_value else '1'
+            try:
+                options.watch = float(interval)
+            except ValueError:
+                options.watch = -1.0
+            if not options.watch > 0:
+                usage_error(prog_name, f"invalid value for {flag}: {interval}")
+        elif flag == '--profile':
+            # The value is optional, so only "--profile=json" takes one
+            options.profile = value if has_value else 'text'
+            if options.profile not in ('text', 'json'):
+                usage_error(prog_name, f"invalid value for {flag}: {options.profile}")
         else:
-            print(f"{prog_name}: unknown option: {flag}", file=sys.stderr)
-            print(f"Try '{prog_name} --help' for more information.", file=sys.stderr)
-            sys.exit(1)
+            usage_error(prog_name, f"unknown option: {arg}")
+
+    if options.compress_linear is not None and (options.output_format == 'binary' or options.watch):
+        usage_error(prog_name, "--compress-linear works with neither --format binary nor --watch")
 
     # Now parse positional arguments (after options/flags)
-    if len(args) == 0:
-        # No arguments: use current directory
-        repo_path = '.'
-        output_file = None
-    elif len(args) == 1:
+    options.paths = positional
+    if len(positional) >= 1:
         # One argument: repo path, output to stdout
-        repo_path = args[0]
-        output_file = None
-    else:
+        options.repo_path = positional[0]
+    if len(positional) >= 2:
         # Two or more arguments: repo path and output file
-        repo_path = args[0]
-        output_file = args[1]
-
-    # Check if it's a valid git repository
+        options.output_file = positional[1]
+
+    return options
+
+
+def batch(options: Options):
+    """Render every repository of options.paths into options.batch"""
+    settings = {
+        'engine': options.engine,
+        'source': options.source,
+        'revision_args': (options.revisions or ['--all']) + options.limits,
+        'local_dates': options.local_dates,
+        'unique_hashes': options.unique_hashes,
+        'max_columns': options.max_columns,
+        'output_format': options.output_format,
+        'compress_linear': options.compress_linear,
+        'checkpoint_interval': 10000 if options.checkpoint_interval is None else options.checkpoint_interval,
+    }
+    window = (options.author_width, options.skip, options.max_count)
     try:
-        subprocess.run(['git', '-C', repo_path, 'rev-parse', '--git-dir'],
-                      capture_output=True, text=True, check=True)
-    except subprocess.CalledProcessError:
-        print(f"fatal: not a git repository (or any of the parent directories): .git", file=sys.stderr)
+        summary = render_batch(options.paths or ['.'], options.batch, settings, window,
+                               options.jobs, options.timeout)
+    except OSError as e:
+        print(f"fatal: {e}", file=sys.stderr)
         sys.exit(1)
-    except FileNotFoundError:
-        print(f"fatal: git command not found", file=sys.stderr)
+    print(format_batch_summary(summary), file=sys.stderr)
+    if summary['failed']:
         sys.exit(1)
 
-    renderer = TigStyleRendererV2(repo_path)
 
-    if output_file:
-        # Output to file
-        renderer.render_to_file(output_file)
-    else:
-        # Output to stdout
-        output = renderer.render()
+def render_remote(options: Options) -> bool:
+    """Have the graph server at options.connect render the output.
+
+    Returns False, without output, when no server is listening. Binary
+    records and compressed runs are not served: they are always rendered
+    locally.
+    """
+    if options.output_format == 'binary' or options.compress_linear is not None:
+        return False
+    try:
+        sock = connect_server(options.connect)
+    except OSError:
+        return False
+
+    lines = iter_server_lines(sock, request_options(options))
+    try:
+        if options.output_file:
+            with open(options.output_file, 'w', encoding='utf-8') as f:
+                write_lines(f, lines)
+        else:
+            write_stdout(lines)
+    except ServerError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    return True
+
+
+def write_view(view: GraphWatch, options: Options):
+    """Write the current lines of a --watch view to its output"""
+    binary = options.output_format == 'binary'
+    if options.output_file:
+        # Readers of the file never see it half written
+        tmp_path = f'{options.output_file}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+            if binary:
+                write_records(f, view.lines)
+            else:
+                write_lines(f, view.lines)
+        os.replace(tmp_path, options.output_file)
+        return
+    if sys.stdout.isatty():
+        # Redraw from the top of a cleared screen
+        sys.stdout.write('\x1b[H\x1b[2J')
+    write_stdout(view.lines, binary=binary)
+
+
+def watch(renderer: TigStyleRendererV2, options: Options):
+    """Render, then render again whenever the refs move, until interrupted.
+
+    The ref files are only stat'ed between renders (see ref_fingerprint);
+    git runs when one of them changed, and the graph is laid out again only
+    if a ref tip or HEAD actually moved.
+    """
+    git_dir, common_dir = (os.path.join(renderer.repo_path, path) for path in
+                           renderer.run_git(['rev-parse', '--git-dir', '--git-common-dir']).split())
+    view = GraphWatch(renderer, options.author_width, options.skip, options.max_count)
+    fingerprint = tips = None
+    try:
+        while True:
+            current = ref_fingerprint(git_dir, common_dir)
+            if current != fingerprint:
+                fingerprint = current
+                current = view.tips(git_dir)
+                if current != tips:
+                    tips = current
+                    if view.update():
+                        write_view(view, options)
+                    else:
+                        # The refs moved during the update: try again
+                        fingerprint = tips = None
+                        continue
+            time.sleep(options.watch)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    # Parse arguments
+    prog_name = os.path.basename(sys.argv[0])  # Get actual command name used
+    options = parse_args(prog_name, sys.argv[1:])  # Skip program name
+    if options.serve:
         try:
-            print(output)
-            sys.stdout.flush()
-        except BrokenPipeError:
-            # Handle broken pipe gracefully (e.g., when piping to head, less, etc.)
-            devnull = os.open(os.devnull, os.O_WRONLY)
-            os.dup2(devnull, sys.stdout.fileno())
-            sys.exit(0)
+            serve(options.serve)
+        except OSError as e:
+            print(f"fatal: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+    if options.connect and render_remote(options):
+        return
+    if options.batch:
+        batch(options)
+        return
 
+    profiler = Profiler() if options.profile else None
+    repo_path = options.repo_path
 
-if __name__ == '__main__':
+    try:
+        renderer = TigStyleRendererV2(repo_path, options.engine)
+    except ImportError:
+        print("fatal: --engine numpy requires NumPy", file=sys.stderr)
+        sys.exit(1)
+    if options.checkpoint_interval is not None:
+        renderer.checkpoint_interval = options.checkpoint_interval
+    renderer.pipelined = options.pipeline
+    renderer.local_dates = options.local_dates
+    renderer.unique_hashes = options.unique_hashes
+    renderer.source = options.source
+    renderer.graph.max_columns = options.max_columns
+    renderer.output_format = options.output_format
+    renderer.compress_linear = options.compress_linear
+    renderer.revision_args = (options.revisions or ['--all']) + options.limits
+    if profiler:
+        profiler.attach(renderer)
+    window = (options.author_width, options.skip, options.max_count)
+
+    try:
+        if options.watch:
+            watch(renderer, options)
+        elif options.output_file:
+            # Output to file
+            renderer.render_to_file(options.output_file, *window)
+        else:
+            # Output to stdout, line by line as commits are laid out
+            output = profiler.timed('write', write_stdout) if profiler else write_stdout
+            output(renderer.iter_lines(*window), options.pipeline, options.output_format == 'binary')
+    except subprocess.CalledProcessError as e:
+        # The repository is not checked up front, to spare a git process
+        # on every run: a path that isn't one fails here with git's message
+        print((e.stderr or f"fatal: {e}").strip(), file=sys.stderr)
+        sys.exit(1)
+    except FileNotFoundError as e:
+        if e.filename != 'git':
+            raise
+        print("fatal: git command not found", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if profiler:
+            profiler.stop()
+            if options.profile == 'json':
+                import json
+                print(json.dumps(profiler.report(), indent=2), file=sys.stderr)
+            else:
+                print(profiler.format_report(), file=sys.stderr)
+
+
+def run():
+    """Entry point of the script and of the installed ggg launcher"""
     try:
         main()
     except BrokenPipeError:
@@ -965,3 +4239,7 @@ if __name__ == '__main__':
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
         sys.exit(0)
+
+
+if __name__ == '__main__':
+    run()
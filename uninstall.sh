@@ -35,6 +35,13 @@ for dir in "${CANDIDATES[@]}"; do
             echo "✓ Removed gg"
         fi
 
+        lib_dir="$(dirname "$dir")/lib/pyggg"
+        if [ -f "$lib_dir/pyggg.py" ]; then
+            echo "Removing $lib_dir..."
+            rm -r "$lib_dir"
+            echo "✓ Removed pyggg module"
+        fi
+
         echo
     fi
 done